@@ -2,15 +2,95 @@ from heapq import heappush, heappop
 from collections import defaultdict, deque
 from typing import List, Dict, Tuple
 import math
+import numpy as np
 
 # Player Graph for Matchmaking
 class PlayerGraph:
     def __init__(self):
         self.nodes = defaultdict(list)  # node: [(neighbor, cost), ...]
+        self.ids = {}  # player -> interned id, also its bit in group bitmasks
+        self.names = []  # id -> player
+        self.adj = []  # id -> [(neighbor id, cost), ...]
+        self.version = 0  # Bumped by add_edge so tables derived from adj can be invalidated
+    
+    def intern(self, player: str) -> int:
+        player_id = self.ids.get(player)
+        if player_id is None:
+            player_id = self.ids[player] = len(self.names)
+            self.names.append(player)
+            self.adj.append([])
+        return player_id
     
     def add_edge(self, player1: str, player2: str, cost: float):
         self.nodes[player1].append((player2, cost))
         self.nodes[player2].append((player1, cost))  # Undirected for matchmaking
+        id1, id2 = self.intern(player1), self.intern(player2)
+        self.adj[id1].append((id2, cost))
+        self.adj[id2].append((id1, cost))
+        self.version += 1
+    
+    def remove_node(self, player: str):
+        """Drop a player's edges; its interned id (and bitmask bit) stays reserved."""
+        player_id = self.ids.get(player)
+        if player_id is None:
+            return
+        for neighbor, _ in self.adj[player_id]:
+            self.adj[neighbor] = [(other, cost) for other, cost in self.adj[neighbor] if other != player_id]
+            self.nodes[self.names[neighbor]] = [(other, cost) for other, cost in self.nodes[self.names[neighbor]]
+                                                if other != player]
+        self.adj[player_id] = []
+        self.nodes.pop(player, None)
+        self.version += 1
+
+# Candidate-Edge Index
+class CandidateIndex:
+    """
+    Replaces all-pairs graph construction. Players are bucketed by (region, mode)
+    and each bucket is sorted by (skill, latency), so good partners sit close
+    together. Each player is linked only to its `fan_out` cheapest candidates
+    within `window` positions either side: O(n * window) work and at most
+    n * fan_out edges instead of O(n^2).
+    """
+    def __init__(self, metadata: Dict, players: List[str]):
+        self.metadata = metadata
+        self.buckets = defaultdict(list)  # (region, mode) -> players sorted by (skill, latency)
+        for player in players:
+            preferences = metadata[player]["preferences"]
+            self.buckets[(preferences["region"], preferences["mode"])].append(player)
+        for members in self.buckets.values():
+            members.sort(key=lambda p: (metadata[p]["skill"], metadata[p]["latency"]))
+    
+    def candidate_edges(self, fan_out: int = 8, window: int = None):
+        """Yield (player1, player2, cost) once per undirected candidate edge."""
+        window = window or 2 * fan_out
+        for members in self.buckets.values():
+            n = len(members)
+            if n < 2:
+                continue
+            skill = np.array([self.metadata[p]["skill"] for p in members], dtype=np.float64)
+            latency = np.array([self.metadata[p]["latency"] for p in members], dtype=np.float64)
+            w = min(window, n - 1)
+            # costs[i, w + d - 1] is the cost to the player d places after i,
+            # costs[i, w - d] to the one d places before (same mode, so no mismatch term)
+            costs = np.full((n, 2 * w), np.inf)
+            for d in range(1, w + 1):
+                pair_costs = np.abs(skill[d:] - skill[:-d]) / 100.0 + (latency[d:] + latency[:-d]) / 1000.0
+                costs[:n - d, w + d - 1] = pair_costs
+                costs[d:, w - d] = pair_costs
+            k = min(fan_out, 2 * w)
+            columns = np.argpartition(costs, k - 1, axis=1)[:, :k]
+            rows = np.repeat(np.arange(n), k)
+            columns = columns.ravel()
+            chosen = costs[rows, columns]
+            offsets = np.where(columns >= w, columns - w + 1, columns - w)
+            neighbors = rows + offsets
+            keep = np.isfinite(chosen)
+            # Each edge may be picked from both ends; keep one copy
+            low = np.minimum(rows, neighbors)[keep]
+            high = np.maximum(rows, neighbors)[keep]
+            pair_ids, first = np.unique(low * n + high, return_index=True)
+            for a, b, cost in zip(low[first].tolist(), high[first].tolist(), chosen[keep][first].tolist()):
+                yield members[a], members[b], cost
 
 # GameKit Matchmaker
 class GameKitMatchmaker:
@@ -18,9 +98,53 @@ class GameKitMatchmaker:
         self.graph = PlayerGraph()
         self.metadata = {}  # Hash Table: player -> {skill, latency, preferences}
         self.elo_k = 32  # Elo constant
+        # Columnar copies of the cost inputs, one row per player, for vectorised costs
+        self.rows = {}  # player -> row
+        self.free_rows = []  # Rows of removed players, reused before the columns grow
+        self.mode_codes = {}  # mode -> small int
+        self.skill = np.zeros(16)
+        self.latency = np.zeros(16)
+        self.mode = np.zeros(16, dtype=np.int32)
+        self._search_tables = None  # (graph version, cheapest_edges(), id -> cost-sorted adjacency)
     
     def add_player(self, player: str, skill: int, latency: int, preferences: Dict):
         self.metadata[player] = {"skill": skill, "latency": latency, "preferences": preferences}
+        row = self.rows.get(player)
+        if row is None and self.free_rows:
+            row = self.rows[player] = self.free_rows.pop()
+        elif row is None:
+            row = self.rows[player] = len(self.rows)
+            if row == len(self.skill):
+                # Grow all columns by doubling so appends stay amortised O(1)
+                self.skill = np.concatenate([self.skill, np.zeros(row)])
+                self.latency = np.concatenate([self.latency, np.zeros(row)])
+                self.mode = np.concatenate([self.mode, np.zeros(row, dtype=np.int32)])
+        self.skill[row] = skill
+        self.latency[row] = latency
+        self.mode[row] = self.mode_codes.setdefault(preferences["mode"], len(self.mode_codes))
+    
+    def remove_player(self, player: str) -> bool:
+        """Forget a player (e.g. once matched or gone); their column row is recycled."""
+        if self.metadata.pop(player, None) is None:
+            return False
+        self.free_rows.append(self.rows.pop(player))
+        self.graph.remove_node(player)
+        return True
+    
+    def row_ids(self, players: List[str]) -> np.ndarray:
+        return np.fromiter((self.rows[p] for p in players), dtype=np.int64, count=len(players))
+    
+    def cost_block(self, rows1: np.ndarray, rows2: np.ndarray) -> np.ndarray:
+        """calculate_cost for every (rows1[i], rows2[j]) pair at once, as a len(rows1) x len(rows2) matrix."""
+        skill_diff = np.abs(self.skill[rows1][:, None] - self.skill[rows2][None, :]) / 100.0
+        latency_cost = (self.latency[rows1][:, None] + self.latency[rows2][None, :]) / 1000.0
+        pref_mismatch = np.where(self.mode[rows1][:, None] != self.mode[rows2][None, :], 0.5, 0.0)
+        return skill_diff + latency_cost + pref_mismatch
+    
+    def cost_matrix(self, players: List[str]) -> np.ndarray:
+        """Pairwise cost matrix for players (O(n^2) memory; use cost_block to tile large pools)."""
+        rows = self.row_ids(players)
+        return self.cost_block(rows, rows)
     
     def calculate_cost(self, player1: str, player2: str) -> float:
         # Rule-based scoring: Combine skill difference, latency, preference mismatch
@@ -35,41 +159,208 @@ class GameKitMatchmaker:
         cost = self.calculate_cost(player1, player2)
         self.graph.add_edge(player1, player2, cost)
     
+    def cheapest_edges(self) -> List[Tuple[float, int]]:
+        """(cheapest incident edge cost, player id) for every player, cheapest first."""
+        return sorted((min(cost for _, cost in edges), player_id)
+                      for player_id, edges in enumerate(self.graph.adj) if edges)
+    
+    def heuristic(self, mask: int, remaining: int, cheapest: List[Tuple[float, int]]) -> float:
+        """
+        Lower bound on the cost of adding `remaining` more players to the group in `mask`:
+        each one arrives over one of its own edges, so take the `remaining` smallest
+        cheapest-edge costs among players outside the group (inf if there are too few).
+        """
+        total = 0.0
+        for cost, player_id in cheapest:
+            if remaining == 0:
+                return total
+            if not mask >> player_id & 1:
+                total += cost
+                remaining -= 1
+        return total if remaining == 0 else math.inf
+    
+    def _tables(self):
+        """cheapest_edges() and a lazily filled id -> [(cost, neighbor)] cheapest-first cache."""
+        if self._search_tables is None or self._search_tables[0] != self.graph.version:
+            self._search_tables = (self.graph.version, self.cheapest_edges(), {})
+        return self._search_tables[1], self._search_tables[2]
+    
+    def _by_cost(self, by_cost: Dict, player_id: int) -> List[Tuple[float, int]]:
+        ordered = by_cost.get(player_id)
+        if ordered is None:
+            ordered = by_cost[player_id] = sorted((cost, neighbor) for neighbor, cost in self.graph.adj[player_id])
+        return ordered
+    
     def uniform_cost_search(self, start_player: str, goal_size: int) -> Tuple[List[str], float]:
-        open_list = [(0, [start_player], 0)]  # (total_cost, group, path_cost)
-        closed = set()
+        # A state is (group bitmask over interned ids, last player): groups grow
+        # along edges from the last player, so both are needed to tell states apart
+        graph = self.graph
+        start = graph.ids.get(start_player)
+        if start is None:
+            return ([start_player], 0) if goal_size == 1 else (None, float('inf'))
+        # Branch and bound: `bound` is the cheapest complete group seen so far (first a
+        # greedy walk), and a move whose cost plus the admissible heuristic exceeds it
+        # cannot lead to a cheaper group. Neighbors are scanned cheapest first, so the
+        # scan stops at the first such move. Expansion is still in path-cost order, so
+        # the first goal popped is optimal exactly as in plain UCS.
+        cheapest, by_cost = self._tables()
+        bound = 0.0
+        mask, last = 1 << start, start
+        for _ in range(goal_size - 1):
+            step = next(((cost, neighbor) for cost, neighbor in self._by_cost(by_cost, last)
+                         if not mask >> neighbor & 1), None)
+            if step is None:
+                bound = math.inf
+                break
+            bound += step[0]
+            last = step[1]
+            mask |= 1 << last
+        start_state = (1 << start, start)
+        best = {start_state: 0}  # state -> cheapest path cost pushed so far
+        parent = {start_state: None}
+        open_list = [(0, 0, 1 << start, start, 1)]  # (path_cost, tie-breaker, mask, last, size)
+        counter = 0
         
         while open_list:
-            total_cost, group, path_cost = heappop(open_list)
-            group_tuple = tuple(sorted(group))
-            if group_tuple in closed:
-                continue
-            if len(group) == goal_size:
-                return group, path_cost
-            closed.add(group_tuple)
+            path_cost, _, mask, last, size = heappop(open_list)
+            if path_cost > best[(mask, last)]:
+                continue  # Stale entry, a cheaper path to this state was pushed later
+            if size == goal_size:
+                group = []
+                state = (mask, last)
+                while state is not None:
+                    group.append(graph.names[state[1]])
+                    state = parent[state]
+                return group[::-1], path_cost
             
-            last_player = group[-1]
-            for neighbor, cost in self.graph.nodes[last_player]:
-                if neighbor in group:
-                    continue
-                new_group = group + [neighbor]
+            # Bound on the players still to add after the next one, valid for every neighbor
+            rest = self.heuristic(mask, goal_size - size - 1, cheapest)
+            for cost, neighbor in self._by_cost(by_cost, last):
                 new_cost = path_cost + cost
-                heappush(open_list, (new_cost, new_group, new_cost))
+                if new_cost + rest > bound:
+                    break  # Every later neighbor costs at least as much
+                bit = 1 << neighbor
+                if mask & bit:
+                    continue
+                new_state = (mask | bit, neighbor)
+                # Duplicate detection at push time: only an improvement enters the heap
+                old_cost = best.get(new_state)
+                if old_cost is not None and old_cost <= new_cost:
+                    continue
+                if size + 1 == goal_size:
+                    bound = min(bound, new_cost)
+                best[new_state] = new_cost
+                parent[new_state] = (mask, last)
+                counter += 1
+                heappush(open_list, (new_cost, counter, mask | bit, neighbor, size + 1))
         
         return None, float('inf')
     
     def greedy_matching(self, players: List[str], goal_size: int) -> List[str]:
         if len(players) < goal_size:
             return None
-        group = [players[0]]
-        remaining = players[1:]
+        rows = self.row_ids(players)
+        taken = np.zeros(len(players), dtype=bool)
+        taken[0] = True
+        group = [0]
+        
+        while len(group) < goal_size:
+            # One cost row from the last pick to everyone; taken players are masked out
+            costs = self.cost_block(rows[group[-1]:group[-1] + 1], rows)[0]
+            costs[taken] = np.inf
+            best = int(np.argmin(costs))  # First minimum, as min() over remaining gave
+            taken[best] = True
+            group.append(best)
         
-        while len(group) < goal_size and remaining:
-            best_player = min(remaining, key=lambda p: self.calculate_cost(group[-1], p))
-            group.append(best_player)
-            remaining.remove(best_player)
+        return [players[i] for i in group]
+    
+    def group_cost(self, rows: np.ndarray) -> float:
+        """Sum of calculate_cost over every pair in the group."""
+        costs = self.cost_block(rows, rows)
+        np.fill_diagonal(costs, 0.0)
+        return float(costs.sum()) / 2
+    
+    def _swap_between(self, group1: np.ndarray, group2: np.ndarray) -> bool:
+        """Apply the single swap between two groups that lowers their total cost the most, if any."""
+        within1 = self.cost_block(group1, group1)
+        within2 = self.cost_block(group2, group2)
+        np.fill_diagonal(within1, 0.0)
+        np.fill_diagonal(within2, 0.0)
+        across = self.cost_block(group1, group2)
+        # delta[i, j]: change in total cost if group1[i] and group2[j] trade places
+        delta = ((across.sum(axis=0)[None, :] - across) - within1.sum(axis=1)[:, None]
+                 + (across.sum(axis=1)[:, None] - across) - within2.sum(axis=1)[None, :])
+        i, j = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, j] >= -1e-9:
+            return False
+        group1[i], group2[j] = group2[j], group1[i]
+        return True
+    
+    def _swap_with_bench(self, group: np.ndarray, bench: np.ndarray) -> bool:
+        """Swap a group member for an unplaced player if that makes the group cheaper."""
+        within = self.cost_block(group, group)
+        np.fill_diagonal(within, 0.0)
+        across = self.cost_block(group, bench)
+        delta = (across.sum(axis=0)[None, :] - across) - within.sum(axis=1)[:, None]
+        i, j = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, j] >= -1e-9:
+            return False
+        group[i], bench[j] = bench[j], group[i]
+        return True
+    
+    def partition_lobby(self, players: List[str], goal_size: int, span: int = 2, max_passes: int = 10) -> Dict:
+        """
+        Split the whole pool into disjoint groups of goal_size in one pass,
+        instead of one search per group. Each region is sorted by (mode, skill,
+        latency) and cut into consecutive groups, which places similar players
+        together. Local search then repeatedly applies the best cost-lowering swap
+        between groups up to `span` apart in that order, and between a group and
+        the region's leftover players, until no swap helps. A group's cost is the
+        sum of its pairwise costs.
+        Returns:
+            {"groups": [(group, cost)], "unmatched": [...], "total_cost", "worst_cost"}
+        """
+        by_region = defaultdict(list)
+        for player in players:
+            by_region[self.metadata[player]["preferences"]["region"]].append(player)
+        
+        player_of = {}
+        all_groups = []
+        unmatched = []
+        for members in by_region.values():
+            rows = self.row_ids(members)
+            player_of.update(zip(rows.tolist(), members))
+            rows = rows[np.lexsort((self.latency[rows], self.skill[rows], self.mode[rows]))]
+            full = len(rows) - len(rows) % goal_size
+            groups = [rows[i:i + goal_size].copy() for i in range(0, full, goal_size)]
+            bench = rows[full:].copy()
+            # After the first pass, only retry pairs where a group (or the bench) changed
+            dirty = set(range(len(groups)))
+            bench_dirty = True
+            for _ in range(max_passes):
+                changed = set()
+                bench_changed = False
+                for g in range(len(groups)):
+                    for h in range(g + 1, min(len(groups), g + span + 1)):
+                        if (g in dirty or h in dirty) and self._swap_between(groups[g], groups[h]):
+                            changed.update((g, h))
+                    if len(bench) and (g in dirty or bench_dirty) and self._swap_with_bench(groups[g], bench):
+                        changed.add(g)
+                        bench_changed = True
+                if not changed:
+                    break
+                dirty, bench_dirty = changed, bench_changed
+            all_groups.extend(groups)
+            unmatched.extend(player_of[row] for row in bench.tolist())
         
-        return group if len(group) == goal_size else None
+        result = [([player_of[row] for row in group.tolist()], self.group_cost(group)) for group in all_groups]
+        costs = [cost for _, cost in result]
+        return {
+            "groups": result,
+            "unmatched": unmatched,
+            "total_cost": sum(costs),
+            "worst_cost": max(costs, default=0.0),
+        }
     
     def update_elo(self, winner: str, loser: str):
         # Elo rating update
@@ -78,13 +369,14 @@ class GameKitMatchmaker:
         expected_w = 1 / (1 + 10 ** ((l_skill - w_skill) / 400))
         self.metadata[winner]["skill"] += int(self.elo_k * (1 - expected_w))
         self.metadata[loser]["skill"] += int(self.elo_k * (0 - (1 - expected_w)))
+        self.skill[self.rows[winner]] = self.metadata[winner]["skill"]
+        self.skill[self.rows[loser]] = self.metadata[loser]["skill"]
     
-    def match_players(self, players: List[str], goal_size: int):
-        # Cluster by region (simplified)
-        for i, p1 in enumerate(players):
-            for p2 in players[i+1:]:
-                if self.metadata[p1]["preferences"]["region"] == self.metadata[p2]["preferences"]["region"]:
-                    self.add_match_edge(p1, p2)
+    def match_players(self, players: List[str], goal_size: int, fan_out: int = 8):
+        # Link each player to its nearest candidates in the same region and mode
+        index = CandidateIndex(self.metadata, players)
+        for p1, p2, cost in index.candidate_edges(fan_out):
+            self.graph.add_edge(p1, p2, cost)
         
         # Try UCS
         group, cost = self.uniform_cost_search(players[0], goal_size)
@@ -110,6 +402,10 @@ if __name__ == "__main__":
     # Match 3 players
     group = matchmaker.match_players(["Player1", "Player2", "Player3", "Player4"], 3)
     
+    # Place the whole lobby at once
+    lobby = matchmaker.partition_lobby(["Player1", "Player2", "Player3", "Player4"], 2)
+    print(f"Lobby Groups: {lobby['groups']}, Total: {lobby['total_cost']:.2f}, Worst: {lobby['worst_cost']:.2f}")
+    
     # Update Elo (e.g., Player1 wins against Player2)
     if group:
         matchmaker.update_elo("Player1", "Player2")
@@ -1,4 +1,4 @@
-from fibonacci_heap import FibonacciHeap
+from heapq import heappush, heappop, nsmallest
 from collections import defaultdict
 from typing import List, Dict, Tuple, Optional
 import math
@@ -6,15 +6,32 @@ import math
 class PlayerGraph:
     def __init__(self):
         self.nodes = defaultdict(list)  # player: [(neighbor, cost), ...]
+        self.ids = {}  # player -> interned id, also its bit in group bitmasks
+        self.names = []  # id -> player
+        self.adj = []  # id -> [(neighbor id, cost), ...]
+        self.version = 0  # Bumped by add_edge so tables derived from adj can be invalidated
+
+    def intern(self, player: str) -> int:
+        player_id = self.ids.get(player)
+        if player_id is None:
+            player_id = self.ids[player] = len(self.names)
+            self.names.append(player)
+            self.adj.append([])
+        return player_id
 
     def add_edge(self, player1: str, player2: str, cost: float):
         self.nodes[player1].append((player2, cost))
         self.nodes[player2].append((player1, cost))
+        id1, id2 = self.intern(player1), self.intern(player2)
+        self.adj[id1].append((id2, cost))
+        self.adj[id2].append((id1, cost))
+        self.version += 1
 
 class AStarMatchmaker:
     def __init__(self):
         self.graph = PlayerGraph()
         self.metadata = {}  # player -> {skill, latency, preferences}
+        self._search_tables = None  # (graph version, cheapest_edges(), id -> cost-sorted adjacency)
 
     def add_player(self, player: str, skill: int, latency: int, preferences: Dict):
         self.metadata[player] = {"skill": skill, "latency": latency, "preferences": preferences}
@@ -31,36 +48,123 @@ class AStarMatchmaker:
         cost = self.calculate_cost(player1, player2)
         self.graph.add_edge(player1, player2, cost)
 
-    def heuristic(self, group: List[str], goal_size: int) -> float:
-        remaining = goal_size - len(group)
-        return remaining * 0.5  # Average cost per player
+    def cheapest_edges(self) -> List[Tuple[float, int]]:
+        """(cheapest incident edge cost, player id) for every player, cheapest first."""
+        return sorted((min(cost for _, cost in edges), player_id)
+                      for player_id, edges in enumerate(self.graph.adj) if edges)
 
-    def a_star_search(self, start_player: str, goal_size: int) -> List[Tuple[List[str], float]]:
-        heap = FibonacciHeap()
-        start_entry = heap.insert(0, ([start_player], 0))  # (group, g_score)
-        node_map = {start_entry: 0}  # Track heap entries
-        closed = set()
-        results = []
+    def heuristic(self, mask: int, remaining: int, cheapest: List[Tuple[float, int]]) -> float:
+        """
+        Lower bound on the cost of adding `remaining` more players to the group in `mask`.
+        Each added player arrives over one of its own edges, so the bound is the
+        sum of the `remaining` smallest cheapest-edge costs among players not yet
+        in the group. It never overestimates and is consistent, so A* stays exact.
+        """
+        total = 0.0
+        for cost, player_id in cheapest:
+            if remaining == 0:
+                return total
+            if not mask >> player_id & 1:
+                total += cost
+                remaining -= 1
+        return total if remaining == 0 else math.inf  # Not enough reachable players left
 
-        while heap.node_count:
-            group, g_score = heap.extract_min()
-            group_tuple = tuple(sorted(group))
-            if group_tuple in closed:
-                continue
-            if len(group) == goal_size:
-                results.append((group, g_score))
-                if len(results) >= 3:  # Collect multiple candidates
-                    break
-            closed.add(group_tuple)
+    def _tables(self):
+        """cheapest_edges() and a lazily filled id -> [(cost, neighbor)] cheapest-first cache."""
+        if self._search_tables is None or self._search_tables[0] != self.graph.version:
+            self._search_tables = (self.graph.version, self.cheapest_edges(), {})
+        return self._search_tables[1], self._search_tables[2]
 
-            last_player = group[-1]
-            for neighbor, cost in self.graph.nodes[last_player]:
-                if neighbor in group:
+    def _by_cost(self, by_cost: Dict, player_id: int) -> List[Tuple[float, int]]:
+        ordered = by_cost.get(player_id)
+        if ordered is None:
+            ordered = by_cost[player_id] = sorted((cost, neighbor) for neighbor, cost in self.graph.adj[player_id])
+        return ordered
+
+    def a_star_search(self, start_player: str, goal_size: int, max_results: int = 3) -> List[Tuple[List[str], float]]:
+        # A state is (group bitmask over interned ids, last player): groups grow
+        # along edges from the last player, so both are needed to tell states apart
+        graph = self.graph
+        start = graph.ids.get(start_player)
+        if start is None:
+            return [([start_player], 0)] if goal_size == 1 else [(None, float('inf'))]
+        # Branch and bound: once max_results distinct groups have been pushed, `bound` is
+        # the cost of the worst of the cheapest ones, and a move whose cost plus the
+        # heuristic exceeds it cannot lead to a better result. Neighbors are scanned
+        # cheapest first, so the scan stops at the first such move.
+        cheapest, by_cost = self._tables()
+        goal_costs = {}  # mask -> cheapest complete group pushed with those players
+        bound = math.inf
+        start_state = (1 << start, start)
+        best = {start_state: 0}  # state -> cheapest g_score pushed so far
+        parent = {start_state: None}
+        # Entries are (f_score, g_score, counter, mask, last, size, position, rest). A state
+        # entry has position -1; popping it pushes a continuation at position 0 that stands
+        # for all its children, keyed by the lower bound g + next edge cost + rest. Popping a
+        # continuation generates one child and pushes the continuation for the next
+        # neighbor, so a state with 200 neighbors costs two pushes per expansion, not 200.
+        heap = [(self.heuristic(1 << start, goal_size - 1, cheapest), 0, 0, 1 << start, start, 1, -1, 0.0)]
+        counter = 0
+        found = set()
+        results = []
+
+        while heap:
+            f_score, g_score, _, mask, last, size, position, rest = heappop(heap)
+            if g_score > best[(mask, last)]:
+                continue  # Stale entry, a cheaper path to this state was pushed later
+            if position < 0:
+                if size == goal_size:
+                    if mask in found:
+                        continue  # Same players, reached through a different last player
+                    found.add(mask)
+                    group = []
+                    state = (mask, last)
+                    while state is not None:
+                        group.append(graph.names[state[1]])
+                        state = parent[state]
+                    results.append((group[::-1], g_score))
+                    if len(results) >= max_results:  # Collect multiple candidates
+                        break
                     continue
-                new_group = group + [neighbor]
+                # Bound on the players still to add after the next one, valid for every neighbor
+                rest = self.heuristic(mask, goal_size - size - 1, cheapest)
+                position = 0
+            ordered = self._by_cost(by_cost, last)
+            while position < len(ordered):
+                cost, neighbor = ordered[position]
+                position += 1
                 new_g_score = g_score + cost
-                f_score = new_g_score + self.heuristic(new_group, goal_size)
-                heap.insert(f_score, (new_group, new_g_score))
+                if new_g_score + rest > bound:
+                    position = len(ordered)  # Every later neighbor costs at least as much
+                    break
+                bit = 1 << neighbor
+                if mask & bit:
+                    continue
+                new_state = (mask | bit, neighbor)
+                # Duplicate detection at push time: only an improvement enters the heap
+                old_g_score = best.get(new_state)
+                if old_g_score is not None and old_g_score <= new_g_score:
+                    continue
+                if size + 1 == goal_size:
+                    h_score = 0.0
+                    if new_g_score < goal_costs.get(mask | bit, math.inf):
+                        goal_costs[mask | bit] = new_g_score
+                        if len(goal_costs) >= max_results and new_g_score < bound:
+                            bound = nsmallest(max_results, goal_costs.values())[-1]
+                else:
+                    h_score = self.heuristic(mask | bit, goal_size - size - 1, cheapest)
+                    if h_score == math.inf:
+                        continue
+                best[new_state] = new_g_score
+                parent[new_state] = (mask, last)
+                counter += 1
+                heappush(heap, (new_g_score + h_score, new_g_score, counter, mask | bit, neighbor, size + 1, -1, 0.0))
+                break
+            if position < len(ordered):
+                next_f = g_score + ordered[position][0] + rest
+                if next_f <= bound:
+                    counter += 1
+                    heappush(heap, (next_f, g_score, counter, mask, last, size, position, rest))
 
         return results if results else [(None, float('inf'))]
 
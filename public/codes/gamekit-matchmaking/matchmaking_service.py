@@ -0,0 +1,233 @@
+"""Continuous matchmaking around GameKitMatchmaker.
+
+Players join and leave at any time; every tick the service batches the whole
+queue and forms as many groups as it can. A player's acceptance window (the
+largest pair cost they will take) widens with the time they have waited, so
+strict matches come first and long waiters still get placed.
+
+Usage: python matchmaking_service.py [arrivals_per_second] [seconds]
+"""
+import asyncio
+import importlib.util
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# The matchmaker's file name has spaces, so load it by path
+_spec = importlib.util.spec_from_file_location(
+    "ucs_matchmaking", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "GameKit Multiplayer Matchmaking with UCS.py"))
+ucs_matchmaking = importlib.util.module_from_spec(_spec)
+sys.modules["ucs_matchmaking"] = ucs_matchmaking
+_spec.loader.exec_module(ucs_matchmaking)
+
+class MatchmakingService:
+    def __init__(self, matchmaker=None, goal_size: int = 4, tick_interval: float = 0.1,
+                 base_window: float = 0.6, widen_rate: float = 0.3, max_window: float = 3.0,
+                 scan: int = 4, reach: int = 64, clock=time.monotonic):
+        self.matchmaker = matchmaker or ucs_matchmaking.GameKitMatchmaker()
+        self.goal_size = goal_size
+        self.tick_interval = tick_interval
+        self.base_window = base_window  # Acceptance window (max pair cost) on joining
+        self.widen_rate = widen_rate  # Window growth per second waited
+        self.max_window = max_window
+        self.scan = scan  # Partners are picked from the anchor's scan * goal_size cheapest candidates
+        self.reach = reach  # Candidates: at most this many nearest players by skill on each side
+        self.clock = clock
+        self.queue = {}  # player -> (joined_at, future); dicts keep join order, oldest first
+        self.running = False
+        # Metrics
+        self.started_at = None
+        self.matched_players = 0
+        self.groups_formed = 0
+        self.abandoned = 0
+        self.ticks = 0
+        self.tick_seconds = 0.0
+        self.waits = deque(maxlen=10000)  # Recent wait times of matched players
+
+    def window(self, waited):
+        """Acceptance window after `waited` seconds in the queue."""
+        return np.minimum(self.base_window + self.widen_rate * waited, self.max_window)
+
+    def enqueue(self, player: str, skill: int, latency: int, preferences: Dict) -> asyncio.Future:
+        """Queue a player; the future resolves to (group, group_cost), or None if they leave first."""
+        if player in self.queue:
+            return self.queue[player][1]
+        self.matchmaker.add_player(player, skill, latency, preferences)
+        future = asyncio.get_running_loop().create_future()
+        self.queue[player] = (self.clock(), future)
+        return future
+
+    def dequeue(self, player: str) -> bool:
+        """Remove a waiting player; returns False if they were not queued (e.g. already matched)."""
+        entry = self.queue.pop(player, None)
+        if entry is None:
+            return False
+        self.matchmaker.remove_player(player)
+        self.abandoned += 1
+        if not entry[1].done():
+            entry[1].set_result(None)
+        return True
+
+    async def join(self, player: str, skill: int, latency: int, preferences: Dict) -> Optional[Tuple[List[str], float]]:
+        """Wait for a match; cancelling the wait (e.g. a timeout) takes the player out of the queue.
+
+        If a tick already placed the player when the cancellation arrives, the
+        rest of the group counts on them, so the match is returned instead.
+        """
+        future = self.enqueue(player, skill, latency, preferences)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not self.dequeue(player) and future.done() and future.result() is not None:
+                return future.result()
+            raise
+
+    def tick(self) -> List[Tuple[List[str], float]]:
+        """Form as many groups as the current queue allows; returns them."""
+        start = time.perf_counter()
+        now = self.clock()
+        by_region = defaultdict(list)
+        for player in self.queue:
+            by_region[self.matchmaker.metadata[player]["preferences"]["region"]].append(player)
+
+        groups = []
+        for members in by_region.values():
+            n = len(members)
+            if n < self.goal_size:
+                continue
+            rows = self.matchmaker.row_ids(members)
+            windows = self.window(now - np.array([self.queue[p][0] for p in members]))
+            # A pair costs at least |skill difference| / 100 plus the two latencies / 1000,
+            # so acceptable partners lie in a skill band around the anchor: a slice of the
+            # skill-sorted region, capped at `reach` players either side so a tick stays
+            # O(n * reach)
+            skill = self.matchmaker.skill[rows]
+            latency = self.matchmaker.latency[rows]
+            spread = 100.0 * (windows - (latency + latency.min()) / 1000.0)
+            by_skill = np.argsort(skill, kind="stable")
+            sorted_skill = skill[by_skill]
+            position = np.empty(n, dtype=np.int64)
+            position[by_skill] = np.arange(n)
+            low = np.maximum(np.searchsorted(sorted_skill, skill - spread, "left"), position - self.reach)
+            high = np.minimum(np.searchsorted(sorted_skill, skill + spread, "right"), position + self.reach + 1)
+            band_sizes = (high - low - 1).tolist()
+            low, high = low.tolist(), high.tolist()
+            available = np.ones(n, dtype=bool)
+            remaining = n
+            # Oldest player first: each anchors a group built from its cheapest
+            # partners, taking a partner only if every pair cost in the group
+            # fits inside both players' windows
+            for i in range(n):
+                if remaining < self.goal_size:
+                    break
+                if band_sizes[i] < self.goal_size - 1 or not available[i]:
+                    continue
+                near = by_skill[low[i]:high[i]]
+                near = near[available[near] & (near != i)]
+                costs = self.matchmaker.cost_block(rows[i:i + 1], rows[near])[0]
+                acceptable = costs <= np.minimum(windows[i], windows[near])
+                if np.count_nonzero(acceptable) < self.goal_size - 1:
+                    continue
+                candidates = near[acceptable]
+                candidates = candidates[np.argsort(costs[acceptable], kind="stable")[:self.scan * self.goal_size]]
+                pair_costs = self.matchmaker.cost_block(rows[candidates], rows[candidates])
+                fits = pair_costs <= np.minimum(windows[candidates][:, None], windows[candidates][None, :])
+                chosen = []  # Positions in candidates
+                for c in range(len(candidates)):
+                    if fits[c, chosen].all():
+                        chosen.append(c)
+                        if len(chosen) == self.goal_size - 1:
+                            break
+                else:
+                    continue
+                group = np.concatenate([[i], candidates[chosen]])
+                available[group] = False
+                remaining -= self.goal_size
+                groups.append(([members[j] for j in group], self.matchmaker.group_cost(rows[group])))
+
+        for group, cost in groups:
+            for player in group:
+                joined_at, future = self.queue.pop(player)
+                self.matchmaker.remove_player(player)
+                self.waits.append(now - joined_at)
+                if not future.done():
+                    future.set_result((group, cost))
+            self.matched_players += len(group)
+            self.groups_formed += 1
+        self.ticks += 1
+        self.tick_seconds += time.perf_counter() - start
+        return groups
+
+    async def run(self):
+        """Tick until stop() is called."""
+        self.running = True
+        self.started_at = self.clock()
+        while self.running:
+            await asyncio.sleep(self.tick_interval)
+            self.tick()
+
+    def stop(self):
+        self.running = False
+
+    def metrics(self) -> Dict:
+        elapsed = self.clock() - self.started_at if self.started_at is not None else 0.0
+        waits = np.array(self.waits) if self.waits else np.zeros(1)
+        p50, p90, p99 = np.percentile(waits, [50, 90, 99])
+        return {
+            "queue_depth": len(self.queue),
+            "matched_players": self.matched_players,
+            "groups_formed": self.groups_formed,
+            "abandoned": self.abandoned,
+            "throughput_per_s": self.matched_players / elapsed if elapsed > 0 else 0.0,
+            "wait_p50_s": float(p50),
+            "wait_p90_s": float(p90),
+            "wait_p99_s": float(p99),
+            "mean_tick_ms": 1000 * self.tick_seconds / self.ticks if self.ticks else 0.0,
+        }
+
+async def simulate_load(service: MatchmakingService, rate: float = 200.0, duration: float = 3.0,
+                        patience: float = 4.0, seed: int = 0):
+    """Poisson stream of joins at `rate` per second; players give up after `patience` seconds."""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    end = loop.time() + duration
+    players = []
+
+    async def player(name, skill, latency, preferences):
+        try:
+            await asyncio.wait_for(service.join(name, skill, latency, preferences), patience)
+        except asyncio.TimeoutError:
+            pass  # join() already took them out of the queue
+
+    count = 0
+    next_at = loop.time()
+    while next_at < end:
+        # Sleep to absolute arrival times so sleep overshoot does not lower the rate
+        next_at += rng.expovariate(rate)
+        await asyncio.sleep(max(0.0, next_at - loop.time()))
+        preferences = {"mode": rng.choice(["race", "battle", "coop"]), "region": rng.choice(["US", "EU", "AS"])}
+        players.append(asyncio.create_task(player(
+            f"Player{count}", int(rng.gauss(1500, 200)), rng.randint(20, 150), preferences)))
+        count += 1
+    await asyncio.gather(*players)
+    return count
+
+# Example Usage
+async def main(rate: float = 200.0, seconds: float = 3.0):
+    service = MatchmakingService(goal_size=4, tick_interval=0.05)
+    runner = asyncio.create_task(service.run())
+    joined = await simulate_load(service, rate=rate, duration=seconds)
+    service.stop()
+    await runner
+    print(f"Joined: {joined}")
+    for name, value in service.metrics().items():
+        print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    asyncio.run(main(*args))
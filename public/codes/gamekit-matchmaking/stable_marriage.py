@@ -1,41 +1,135 @@
+from collections import deque
 from typing import List, Dict, Optional
+import numpy as np
 
 class StableMarriage:
     def __init__(self, matchmaker):
         self.matchmaker = matchmaker  # Reference to AStarMatchmaker for cost calculation
 
-    def stable_marriage(self, candidates: List[List[str]], cost_threshold: float) -> Optional[List[str]]:
-        if not candidates:
-            return None
+    def _columns(self, players: List[str]):
+        """Skill, latency and mode code arrays for players, in players order."""
+        metadata = self.matchmaker.metadata
+        skill = np.array([metadata[p]["skill"] for p in players], dtype=np.float64)
+        latency = np.array([metadata[p]["latency"] for p in players], dtype=np.float64)
+        modes = {}
+        mode = np.array([modes.setdefault(metadata[p]["preferences"]["mode"], len(modes)) for p in players])
+        return skill, latency, mode
 
-        # Generate preference lists based on compatibility costs
-        player_prefs = {}
-        all_players = list(set(sum(candidates, [])))
-        for player in all_players:
-            player_prefs[player] = sorted(
-                [p for p in all_players if p != player],
-                key=lambda p: self.matchmaker.calculate_cost(player, p)
-            )
+    def preference_lists(self, players: List[str], top_k: Optional[int] = None,
+                         window: Optional[int] = None):
+        """
+        Each player's preferred partners as indices into players, cheapest first
+        (ties keep players order, like a stable sort on calculate_cost).
+        Full lists come back as an (n, n - 1) int32 array. With top_k, each list
+        is cut to the top_k cheapest candidates among the `window` (default
+        4 * top_k) nearest players by skill, so no n x n cost matrix is built,
+        and the lists (of varying length) come back as a list of lists.
+        """
+        n = len(players)
+        skill, latency, mode = self._columns(players)
 
-        # Gale-Shapley: Players propose to preferred matches
-        group_size = len(candidates[0])
-        engagements = {}  # player -> matched player
-        free_players = all_players.copy()
+        def costs(rows, cols):
+            # Same terms, in the same order, as calculate_cost
+            return (np.abs(skill[rows][:, None] - skill[cols][None, :]) / 100.0
+                    + (latency[rows][:, None] + latency[cols][None, :]) / 1000.0
+                    + np.where(mode[rows][:, None] != mode[cols][None, :], 0.5, 0.0))
+
+        if top_k is None or top_k >= n - 1:
+            everyone = np.arange(n)
+            matrix = costs(everyone, everyone)
+            np.fill_diagonal(matrix, np.inf)
+            return np.argsort(matrix, axis=1, kind="stable")[:, :n - 1].astype(np.int32)
+
+        # Candidates: the nearest `window` players on each side in skill order
+        order = np.argsort(skill, kind="stable")
+        w = min(window or 4 * top_k, n - 1)
+        positions = np.arange(n)[:, None] + np.concatenate([np.arange(-w, 0), np.arange(1, w + 1)])[None, :]
+        valid = (positions >= 0) & (positions < n)
+        candidates = order[np.clip(positions, 0, n - 1)]  # (n, 2w) in skill order
+        rows = order[:, None]
+        band = (np.abs(skill[rows] - skill[candidates]) / 100.0
+                + (latency[rows] + latency[candidates]) / 1000.0
+                + np.where(mode[rows] != mode[candidates], 0.5, 0.0))
+        band[~valid] = np.inf
+        # Sort each row by (cost, player index) and keep the top_k finite entries
+        keys = np.argsort(candidates, axis=1, kind="stable")
+        candidates = np.take_along_axis(candidates, keys, axis=1)
+        band = np.take_along_axis(band, keys, axis=1)
+        keys = np.argsort(band, axis=1, kind="stable")[:, :top_k]
+        chosen = np.take_along_axis(candidates, keys, axis=1)
+        finite = np.isfinite(np.take_along_axis(band, keys, axis=1))
+        prefs = [None] * n
+        for row, player in enumerate(order.tolist()):
+            prefs[player] = chosen[row][finite[row]].tolist()
+        return prefs
+
+    def match(self, players: List[str], top_k: Optional[int] = None) -> Dict[str, str]:
+        """
+        Gale-Shapley over the player list: every player proposes down its
+        preference list and every player holds its best proposal so far.
+        Returns receiver -> held proposer, in the order receivers were first engaged.
+
+        Rank tables give O(1) comparisons, free proposers wait in a deque, and
+        each proposer resumes from where it stopped instead of the top of its
+        list. With top_k only the proposing side is truncated: receivers still
+        rank every proposer by (cost, index), the order a full list would give,
+        computed on the fly. A proposer whose top_k are all held by better
+        proposers stays unmatched.
+        """
+        n = len(players)
+        prefs = self.preference_lists(players, top_k)
+        if top_k is None or top_k >= n - 1:
+            # rank[r, p]: position of proposer p in receiver r's list (inverse of prefs)
+            rank = np.zeros((n, n), dtype=np.int32)
+            rank[np.arange(n)[:, None], prefs] = np.arange(n - 1, dtype=np.int32)
+            # Both tables stay int32; row slices of flat memoryviews index to plain ints
+            flat_prefs, flat_rank = memoryview(prefs.reshape(-1)), memoryview(rank.reshape(-1))
+            prefs = [flat_prefs[i * (n - 1):(i + 1) * (n - 1)] for i in range(n)]
+            rank = [flat_rank[i * n:(i + 1) * n] for i in range(n)]
+
+            def prefers(receiver, new, current):
+                return rank[receiver][new] < rank[receiver][current]
+        else:
+            skill, latency, mode = (column.tolist() for column in self._columns(players))
+
+            def key(receiver, proposer):
+                return (abs(skill[receiver] - skill[proposer]) / 100.0
+                        + (latency[receiver] + latency[proposer]) / 1000.0
+                        + (0.5 if mode[receiver] != mode[proposer] else 0.0), proposer)
+
+            def prefers(receiver, new, current):
+                return key(receiver, new) < key(receiver, current)
+
+        next_proposal = [0] * n
+        held = {}  # receiver -> proposer
+        free_players = deque(range(n))
 
         while free_players:
-            player = free_players[0]
-            for pref in player_prefs[player]:
-                if pref not in engagements:
-                    engagements[pref] = player
-                    free_players.remove(player)
+            player = free_players.popleft()
+            player_prefs = prefs[player]
+            while next_proposal[player] < len(player_prefs):
+                pref = player_prefs[next_proposal[player]]
+                next_proposal[player] += 1
+                current = held.get(pref)
+                if current is None:
+                    held[pref] = player
+                    break
+                if prefers(pref, player, current):
+                    held[pref] = player
+                    free_players.append(current)
                     break
-                else:
-                    current = engagements[pref]
-                    if player_prefs[pref].index(player) < player_prefs[pref].index(current):
-                        engagements[pref] = player
-                        free_players.remove(player)
-                        free_players.append(current)
-                        break
+
+        return {players[receiver]: players[proposer] for receiver, proposer in held.items()}
+
+    def stable_marriage(self, candidates: List[List[str]], cost_threshold: float,
+                        top_k: Optional[int] = None) -> Optional[List[str]]:
+        if not candidates:
+            return None
+
+        # Every player across the candidate groups, in first-appearance order
+        all_players = list(dict.fromkeys(player for group in candidates for player in group))
+        group_size = len(candidates[0])
+        engagements = self.match(all_players, top_k)  # player -> matched player
 
         # Form group from stable matches
         group = list(engagements.values())
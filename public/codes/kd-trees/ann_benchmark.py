@@ -0,0 +1,64 @@
+"""Recall@k vs. throughput for the approximate KD-tree search modes.
+
+Usage: python ann_benchmark.py [n_points] [dims] [n_queries] [k]
+"""
+import importlib.util
+import os
+import sys
+import time
+import numpy as np
+
+# kd-heap.py is not an importable module name, so load it by path
+_spec = importlib.util.spec_from_file_location(
+    "kd_heap", os.path.join(os.path.dirname(os.path.abspath(__file__)), "kd-heap.py"))
+kd_heap = importlib.util.module_from_spec(_spec)
+sys.modules["kd_heap"] = kd_heap
+_spec.loader.exec_module(kd_heap)
+
+def recall_at_k(found, exact):
+    """Fraction of the exact k nearest indices that were returned."""
+    hits = sum(len(set(f.tolist()) & set(e.tolist())) for f, e in zip(found, exact))
+    return hits / exact.size
+
+def run(n_points=200_000, dims=16, n_queries=500, k=10, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.random((n_points, dims))
+    # Queries near the data, as in real lookups
+    targets = points[rng.integers(0, n_points, n_queries)] + rng.normal(0, 0.05, (n_queries, dims))
+
+    start = time.perf_counter()
+    tree = kd_heap.FlatKDTree(points)
+    print(f"Built FlatKDTree over {n_points} x {dims} points in {time.perf_counter() - start:.2f}s")
+
+    def single(**options):
+        return lambda: np.array([tree.knn(t, k, **options)[1] for t in targets])
+
+    def batch(**options):
+        return lambda: tree.query(targets, k, chunk_size=64, **options)[1]
+
+    exact = None
+    print(f"{'mode':<28}{'recall@' + str(k):>10}{'QPS':>12}{'speedup':>10}")
+    modes = [
+        ("exact (knn)", single()),
+        ("eps=0.5 (knn)", single(eps=0.5)),
+        ("eps=1.0 (knn)", single(eps=1.0)),
+        ("eps=2.0 (knn)", single(eps=2.0)),
+        ("max_leaves=256 (knn)", single(max_leaves=256)),
+        ("max_leaves=64 (knn)", single(max_leaves=64)),
+        ("max_leaves=16 (knn)", single(max_leaves=16)),
+        ("max_leaves=4 (knn)", single(max_leaves=4)),
+        ("exact (batch query)", batch()),
+        ("eps=1.0 (batch query)", batch(eps=1.0)),
+    ]
+    base_qps = None
+    for name, fn in modes:
+        start = time.perf_counter()
+        found = fn()
+        qps = n_queries / (time.perf_counter() - start)
+        if exact is None:
+            exact, base_qps = found, qps
+        print(f"{name:<28}{recall_at_k(found, exact):>10.3f}{qps:>12.0f}{qps / base_qps:>9.1f}x")
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    run(*args)
@@ -1,6 +1,10 @@
 import heapq
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 
-def knn_search(node, target, k, heap=None):
+def knn_search(node, target, k, heap=None, eps=0.0):
+    # eps > 0 gives (1 + eps)-approximate neighbours: a far branch is only
+    # explored if it could beat the current k-th distance by that factor
     if node is None:
         return
 
@@ -25,11 +29,11 @@ def knn_search(node, target, k, heap=None):
     far_branch = node.right if diff < 0 else node.left
 
     # Traverse near branch
-    knn_search(near_branch, target, k, heap)
+    knn_search(near_branch, target, k, heap, eps)
 
     # Check if we need to explore the far branch
-    if len(heap) < k or abs(diff) < -heap[0][0]:
-        knn_search(far_branch, target, k, heap)
+    if len(heap) < k or abs(diff) * (1 + eps) < -heap[0][0]:
+        knn_search(far_branch, target, k, heap, eps)
 
     return heap
 import math
@@ -87,3 +91,464 @@ def nearest_neighbor(node, target, depth=0, best=None):
         best = nearest_neighbor(opposite_branch, target, depth + 1, best)
 
     return best
+
+class FlatKDTree:
+    """KD-tree stored as flat NumPy arrays over an index permutation.
+
+    Points live once in an (n, d) array; each node owns a contiguous slice
+    perm[start:end] of point indices. Splits cycle through the axes like
+    build_kdtree but use np.argpartition (introselect) for the median, so each
+    level costs O(n) instead of a full sort and no point lists are copied. Recursion stops at leaf buckets of at most
+    leaf_size points, which are later scanned with vectorised distances.
+    """
+
+    def __init__(self, points, leaf_size=32):
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        n = len(self.points)
+        self.leaf_size = leaf_size
+        self.perm = np.arange(n)
+        split_dim, split_val, left, right, start, end = [], [], [], [], [], []
+
+        def new_node(lo, hi):
+            split_dim.append(-1)
+            split_val.append(0.0)
+            left.append(-1)
+            right.append(-1)
+            start.append(lo)
+            end.append(hi)
+            return len(start) - 1
+
+        dims = self.points.shape[1] if n else 0
+        # Column-major copy so each split reads one contiguous coordinate column
+        columns = np.asfortranarray(self.points)
+        stack = [(new_node(0, n), 0)] if n else []
+        while stack:
+            node, depth = stack.pop()
+            lo, hi = start[node], end[node]
+            if hi - lo <= leaf_size:
+                continue
+            axis = depth % dims  # Alternate axis (x -> y -> z ...)
+            idx = self.perm[lo:hi]
+            mid = (hi - lo) // 2
+            order = np.argpartition(columns[idx, axis], mid)
+            idx[:] = idx[order]
+            split_dim[node] = axis
+            split_val[node] = float(columns[idx[mid], axis])
+            left[node] = new_node(lo, lo + mid)
+            right[node] = new_node(lo + mid, hi)
+            stack.append((right[node], depth + 1))
+            stack.append((left[node], depth + 1))
+
+        # Left subtree holds values <= split_val, right subtree values >= split_val
+        self.split_dim = np.array(split_dim, dtype=np.int32)
+        self.split_val = np.array(split_val, dtype=np.float64)
+        self.left = np.array(left, dtype=np.int32)
+        self.right = np.array(right, dtype=np.int32)
+        self.start = np.array(start, dtype=np.intp)
+        self.end = np.array(end, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.points)
+
+    def knn(self, target, k=1, eps=0.0, max_leaves=None):
+        """Return (distances, indices) of the k nearest points, nearest first.
+
+        Nodes are expanded best-bin-first (closest region first), so the
+        search can stop as soon as the nearest unexplored region is too far.
+        Approximate modes: eps > 0 prunes any region that cannot beat the
+        current k-th distance by a factor of (1 + eps), and max_leaves stops
+        the search after that many leaf buckets once k candidates are held.
+        """
+        target = np.asarray(target, dtype=np.float64)
+        heap = []  # Max heap on squared distance: (-dist2, index)
+        if not len(self.start):
+            return np.empty(0), np.empty(0, dtype=np.intp)
+        shrink = (1 + eps) ** 2
+        leaves = 0
+        frontier = [(0.0, 0)]  # Min heap: (squared lower bound to the region, node)
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(heap) == k and bound * shrink >= -heap[0][0]:
+                break  # Every remaining region is at least this far away
+            axis = self.split_dim[node]
+            if axis < 0:
+                if max_leaves is not None and leaves >= max_leaves and len(heap) == k:
+                    break
+                leaves += 1
+                idx = self.perm[self.start[node]:self.end[node]]
+                diff = self.points[idx] - target
+                dist2 = np.einsum('ij,ij->i', diff, diff)
+                for d2, i in zip(dist2.tolist(), idx.tolist()):
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d2, i))
+                    elif d2 < -heap[0][0]:
+                        heapq.heappushpop(heap, (-d2, i))
+                continue
+            diff = target[axis] - self.split_val[node]
+            near, far = (self.left[node], self.right[node]) if diff <= 0 else (self.right[node], self.left[node])
+            heapq.heappush(frontier, (bound, near))
+            heapq.heappush(frontier, (max(bound, diff * diff), far))
+        heap.sort(key=lambda e: -e[0])
+        return np.sqrt([-d2 for d2, _ in heap]), np.array([i for _, i in heap], dtype=np.intp)
+
+    def query_radius(self, target, r):
+        """Indices of all points within distance r of target."""
+        target = np.asarray(target, dtype=np.float64)
+        r2 = r * r
+        found = []
+        stack = [(0, 0.0)] if len(self.start) else []
+        while stack:
+            node, bound = stack.pop()
+            axis = self.split_dim[node]
+            if axis < 0:
+                idx = self.perm[self.start[node]:self.end[node]]
+                diff = self.points[idx] - target
+                found.append(idx[np.einsum('ij,ij->i', diff, diff) <= r2])
+                continue
+            diff = target[axis] - self.split_val[node]
+            near, far = (self.left[node], self.right[node]) if diff <= 0 else (self.right[node], self.left[node])
+            stack.append((near, bound))
+            # The far side is at least max(bound, diff^2) away: prune it if that exceeds r^2
+            far_bound = max(bound, diff * diff)
+            if far_bound <= r2:
+                stack.append((far, far_bound))
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def query_box(self, lo, hi):
+        """Indices of all points with lo <= point <= hi on every axis."""
+        lo = np.asarray(lo, dtype=np.float64)
+        hi = np.asarray(hi, dtype=np.float64)
+        found = []
+        stack = [0] if len(self.start) else []
+        while stack:
+            node = stack.pop()
+            axis = self.split_dim[node]
+            if axis < 0:
+                idx = self.perm[self.start[node]:self.end[node]]
+                pts = self.points[idx]
+                found.append(idx[np.all((pts >= lo) & (pts <= hi), axis=1)])
+                continue
+            split = self.split_val[node]
+            if lo[axis] <= split:
+                stack.append(self.left[node])
+            if hi[axis] >= split:
+                stack.append(self.right[node])
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def _gather(self, nodes, width):
+        """Point indices of each node's slice, padded to width; returns (indices, valid mask)."""
+        offsets = self.start[nodes][:, None] + np.arange(width)[None, :]
+        valid = offsets < self.end[nodes][:, None]
+        return self.perm[np.where(valid, offsets, 0)], valid
+
+    def _sq_dists(self, targets, indices, valid):
+        diff = self.points[indices] - targets[:, None, :]
+        dist2 = np.einsum('ijk,ijk->ij', diff, diff)
+        dist2[~valid] = np.inf
+        return dist2
+
+    def _query_chunk(self, targets, k, eps=0.0):
+        """Exact kNN for a block of queries, with every step vectorised over the block.
+
+        1. Descend all queries at once to their "home" node: the deepest node
+           on their path still holding >= k points. Its points give each query
+           an upper bound r2 on its k-th squared distance.
+        2. Walk (query, node) pairs level by level, keeping a far child only if
+           the squared distance to its region is <= r2, and skipping the home
+           subtree, whose points are already candidates.
+        3. Take the k smallest over home + reached-leaf candidates per query.
+
+        With eps > 0 a far child must be within r2 / (1 + eps)^2 to be visited.
+        """
+        m = len(targets)
+        size = self.end - self.start
+        rows = np.arange(m)
+
+        home = np.zeros(m, dtype=np.intp)
+        active = rows
+        while len(active):
+            nodes = home[active]
+            axis = self.split_dim[nodes]
+            inner = axis >= 0
+            active, nodes, axis = active[inner], nodes[inner], axis[inner]
+            go_left = targets[active, axis] <= self.split_val[nodes]
+            child = np.where(go_left, self.left[nodes], self.right[nodes])
+            deeper = size[child] >= k
+            active = active[deeper]
+            home[active] = child[deeper]
+
+        home_idx, home_valid = self._gather(home, int(size[home].max()))
+        home_d2 = self._sq_dists(targets, home_idx, home_valid)
+        r2 = np.partition(home_d2, k - 1, axis=1)[:, k - 1]
+
+        home_lo, home_hi = self.start[home], self.end[home]
+        leaf_q, leaf_n = [], []
+        q = rows
+        nodes = np.zeros(m, dtype=np.intp)
+        bound = np.zeros(m)
+        while len(q):
+            outside = (self.start[nodes] < home_lo[q]) | (self.end[nodes] > home_hi[q])
+            q, nodes, bound = q[outside], nodes[outside], bound[outside]
+            axis = self.split_dim[nodes]
+            leaf = axis < 0
+            leaf_q.append(q[leaf])
+            leaf_n.append(nodes[leaf])
+            q, nodes, bound, axis = q[~leaf], nodes[~leaf], bound[~leaf], axis[~leaf]
+            diff = targets[q, axis] - self.split_val[nodes]
+            near = np.where(diff <= 0, self.left[nodes], self.right[nodes])
+            far = np.where(diff <= 0, self.right[nodes], self.left[nodes])
+            far_bound = np.maximum(bound, diff * diff)
+            keep = far_bound * (1 + eps) ** 2 <= r2[q]
+            q = np.concatenate([q, q[keep]])
+            nodes = np.concatenate([near, far[keep]])
+            bound = np.concatenate([bound, far_bound[keep]])
+
+        leaf_q = np.concatenate(leaf_q)
+        leaf_n = np.concatenate(leaf_n)
+        cand_q = [np.repeat(rows, home_idx.shape[1])]
+        cand_i = [home_idx.ravel()]
+        cand_d = [home_d2.ravel()]
+        if len(leaf_q):
+            width = int(size[leaf_n].max())
+            # Score leaf pairs in blocks and keep only points within r2, bounding memory
+            block = max(1, (1 << 16) // width)
+            for lo in range(0, len(leaf_q), block):
+                bq, bn = leaf_q[lo:lo + block], leaf_n[lo:lo + block]
+                leaf_idx, leaf_valid = self._gather(bn, width)
+                leaf_d2 = self._sq_dists(targets[bq], leaf_idx, leaf_valid)
+                close = leaf_d2 <= r2[bq][:, None]
+                cand_q.append(np.broadcast_to(bq[:, None], close.shape)[close])
+                cand_i.append(leaf_idx[close])
+                cand_d.append(leaf_d2[close])
+        cand_q = np.concatenate(cand_q)
+        cand_i = np.concatenate(cand_i)
+        cand_d = np.concatenate(cand_d)
+        # Only points within r2 can make a top k (each query keeps >= k of them)
+        close = cand_d <= r2[cand_q]
+        cand_q, cand_i, cand_d = cand_q[close], cand_i[close], cand_d[close]
+
+        # Per-query top k: sort by (query, distance) and keep the first k of each run
+        order = np.lexsort((cand_d, cand_q))
+        cand_q = cand_q[order]
+        first = np.searchsorted(cand_q, rows)
+        take = (first[:, None] + np.arange(k)[None, :]).ravel()
+        dist = np.sqrt(cand_d[order][take]).reshape(m, k)
+        return dist, cand_i[order][take].reshape(m, k)
+
+    def query(self, targets, k=1, workers=1, chunk_size=1024, use_processes=False, eps=0.0):
+        """Batched kNN for an (m, d) array of targets (exact unless eps > 0).
+
+        Returns (distances, indices), each (m, k) and sorted nearest first.
+        The batch is cut into chunks that run on a thread pool by default;
+        NumPy releases the GIL inside the heavy kernels. With use_processes,
+        a process pool is used instead, and each worker gets the tree once
+        through the pool initializer (copy-on-write under fork) and only reads it.
+        """
+        targets = np.atleast_2d(np.asarray(targets, dtype=np.float64))
+        k = min(k, len(self.points))
+        if k <= 0 or not len(targets):
+            return np.empty((len(targets), 0)), np.empty((len(targets), 0), dtype=np.intp)
+        chunks = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+        if workers == 1 or len(chunks) == 1:
+            results = [self._query_chunk(chunk, k, eps) for chunk in chunks]
+        elif use_processes:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self,)) as pool:
+                results = list(pool.map(_query_worker, chunks, [k] * len(chunks), [eps] * len(chunks)))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(self._query_chunk, chunks, [k] * len(chunks), [eps] * len(chunks)))
+        return np.vstack([d for d, _ in results]), np.vstack([i for _, i in results])
+
+class KDForest:
+    """Dynamic point set built from static FlatKDTrees (logarithmic method).
+
+    Inserts land in a small brute-force buffer. A full buffer becomes a tree
+    at level 0, and two trees on the same level are rebuilt into one tree on
+    the next level, like binary carry. Level L therefore holds at most
+    buffer_size * 2**L points, and each point is rebuilt O(log n) times.
+    Deletes are tombstones. A level is rebuilt from its live points once
+    half of them are dead.
+
+    Points are addressed by integer ids. Internally every insert gets a fresh
+    slot, so re-inserting an id never collides with its tombstoned old copy.
+    """
+
+    def __init__(self, dims, buffer_size=64, leaf_size=32):
+        self.dims = dims
+        self.buffer_size = buffer_size
+        self.leaf_size = leaf_size
+        self.buffer_slots = []
+        self.buffer_points = []
+        self.levels = []  # level -> (FlatKDTree, slots array) or None
+        self.dead = []  # level -> tombstoned points still in that tree
+        self.location = {}  # live slot -> level, or -1 while in the buffer
+        self.deleted = set()  # Tombstoned slots inside static trees
+        self.slot_of = {}  # id -> live slot
+        self.id_of = {}  # live slot -> id
+        self.next_id = 0
+        self.next_slot = 0
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def insert(self, point, point_id=None):
+        """Add a point (replacing any point with the same id); returns its id."""
+        if point_id is None:
+            point_id = self.next_id
+        self.next_id = max(self.next_id, point_id + 1)
+        if point_id in self.slot_of:
+            self.delete(point_id)
+        slot = self.next_slot
+        self.next_slot += 1
+        self.slot_of[point_id] = slot
+        self.id_of[slot] = point_id
+        self.buffer_slots.append(slot)
+        self.buffer_points.append(tuple(point))
+        self.location[slot] = -1
+        if len(self.buffer_slots) >= self.buffer_size:
+            self._carry()
+        return point_id
+
+    def _live(self, level):
+        tree, slots = self.levels[level]
+        if not self.dead[level]:
+            return tree.points, slots
+        keep = np.array([s not in self.deleted for s in slots.tolist()], dtype=bool)
+        self.deleted.difference_update(slots[~keep].tolist())
+        return tree.points[keep], slots[keep]
+
+    def _carry(self):
+        points = np.array(self.buffer_points, dtype=np.float64).reshape(-1, self.dims)
+        slots = np.array(self.buffer_slots, dtype=np.int64)
+        self.buffer_slots, self.buffer_points = [], []
+        level = 0
+        while level < len(self.levels) and self.levels[level] is not None:
+            level_points, level_slots = self._live(level)
+            points = np.vstack([level_points, points])
+            slots = np.concatenate([level_slots, slots])
+            self.levels[level] = None
+            self.dead[level] = 0
+            level += 1
+        if level == len(self.levels):
+            self.levels.append(None)
+            self.dead.append(0)
+        self._place(level, points, slots)
+
+    def _place(self, level, points, slots):
+        self.levels[level] = (FlatKDTree(points, self.leaf_size), slots) if len(slots) else None
+        self.dead[level] = 0
+        for slot in slots.tolist():
+            self.location[slot] = level
+
+    def delete(self, point_id):
+        """Remove a point by id; returns False if it is not present."""
+        slot = self.slot_of.pop(point_id, None)
+        if slot is None:
+            return False
+        del self.id_of[slot]
+        level = self.location.pop(slot)
+        if level < 0:
+            i = self.buffer_slots.index(slot)
+            del self.buffer_slots[i], self.buffer_points[i]
+            return True
+        self.deleted.add(slot)
+        self.dead[level] += 1
+        if 2 * self.dead[level] >= len(self.levels[level][1]):
+            # Partial rebuild: only this level is rebuilt, from its live points
+            points, slots = self._live(level)
+            self._place(level, points, slots)
+        return True
+
+    def _trees(self):
+        for level, entry in enumerate(self.levels):
+            if entry is not None:
+                yield level, entry[0], entry[1]
+
+    def _buffer_array(self):
+        return np.array(self.buffer_points, dtype=np.float64).reshape(-1, self.dims)
+
+    def _ids(self, slots):
+        return [self.id_of[s] for s in slots if s not in self.deleted]
+
+    def knn(self, target, k=1):
+        """Return [(distance, id)] for the k nearest live points, nearest first."""
+        target = np.asarray(target, dtype=np.float64)
+        candidates = []
+        if self.buffer_slots:
+            dist = np.linalg.norm(self._buffer_array() - target, axis=1)
+            candidates.extend(zip(dist.tolist(), self.buffer_slots))
+        for level, tree, slots in self._trees():
+            # Ask for extra neighbours so k survive the tombstone filter
+            dist, idx = tree.knn(target, min(len(tree), k + self.dead[level]))
+            candidates.extend((d, s) for d, s in zip(dist.tolist(), slots[idx].tolist())
+                              if s not in self.deleted)
+        return [(d, self.id_of[s]) for d, s in heapq.nsmallest(k, candidates)]
+
+    def query_radius(self, target, r):
+        """Ids of all live points within distance r of target."""
+        target = np.asarray(target, dtype=np.float64)
+        found = []
+        if self.buffer_slots:
+            hits = np.flatnonzero(np.linalg.norm(self._buffer_array() - target, axis=1) <= r)
+            found.extend(self._ids(self.buffer_slots[i] for i in hits.tolist()))
+        for _, tree, slots in self._trees():
+            found.extend(self._ids(slots[tree.query_radius(target, r)].tolist()))
+        return found
+
+    def query_box(self, lo, hi):
+        """Ids of all live points inside the axis-aligned box [lo, hi]."""
+        found = []
+        if self.buffer_slots:
+            pts = self._buffer_array()
+            hits = np.flatnonzero(np.all((pts >= np.asarray(lo)) & (pts <= np.asarray(hi)), axis=1))
+            found.extend(self._ids(self.buffer_slots[i] for i in hits.tolist()))
+        for _, tree, slots in self._trees():
+            found.extend(self._ids(slots[tree.query_box(lo, hi)].tolist()))
+        return found
+
+# Process-pool worker state: the tree is installed once per worker and only read
+_worker_tree = None
+
+def _init_worker(tree):
+    global _worker_tree
+    _worker_tree = tree
+
+def _query_worker(targets, k, eps=0.0):
+    return _worker_tree._query_chunk(targets, k, eps)
+
+
+# Example usage
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    points = rng.random((100_000, 3))
+    tree = FlatKDTree(points)
+    target = (0.5, 0.5, 0.5)
+    distances, indices = tree.knn(target, k=3)
+    print(f"3 nearest to {target}: {points[indices].round(4).tolist()}, distances {distances.round(4).tolist()}")
+
+    # Same answer from the pointer-based tree on a small sample
+    sample = [tuple(p) for p in points[:1000].tolist()]
+    root = build_kdtree(sample)
+    flat = FlatKDTree(sample)
+    print(f"Nearest (Node tree): {nearest_neighbor(root, target)}")
+    print(f"Nearest (flat tree): {tuple(flat.points[flat.knn(target, 1)[1][0]].tolist())}")
+
+    # Batched queries: one call for many targets, split across a thread pool
+    targets = rng.random((20_000, 3))
+    distances, indices = tree.query(targets, k=5, workers=4)
+    print(f"Batch of {len(targets)} queries -> {indices.shape} neighbour indices, "
+          f"mean 1-NN distance {distances[:, 0].mean():.4f}")
+
+    # Range queries with subtree pruning
+    print(f"Points within 0.02 of {target}: {len(tree.query_radius(target, 0.02))}")
+    print(f"Points in box [0.4, 0.45]^3: {len(tree.query_box((0.4,) * 3, (0.45,) * 3))}")
+
+    # Continuously changing locations: insert/delete without rebuilding everything
+    forest = KDForest(dims=3)
+    for p in points[:5000]:
+        forest.insert(p)
+    for point_id in range(0, 5000, 2):
+        forest.delete(point_id)
+    print(f"Forest holds {len(forest)} points; nearest ids to {target}: "
+          f"{[point_id for _, point_id in forest.knn(target, 3)]}")
@@ -1,78 +1,235 @@
 import math
 from collections import defaultdict
-import heapq
+import numpy as np
+
+def _encode_apps(events):
+    """Map app ids to dense ints in sorted order, so a smaller id means a lexicographically smaller app."""
+    names = sorted(set(events))
+    ids = {app: i for i, app in enumerate(names)}
+    return names, [ids[app] for app in events]
+
+def _hilbert_index(x, y, n):
+    """Position of (x, y) along a Hilbert curve filling an n x n grid (n a power of two)."""
+    d = 0
+    s = n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            # Rotate the quadrant so the curve stays continuous
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+def _mos_order(queries, block_size, N, order):
+    """Indices of queries in processing order: odd-even block order or Hilbert order."""
+    if order == "hilbert":
+        n = 1 << max(N - 1, 1).bit_length()
+        return sorted(range(len(queries)), key=lambda i: _hilbert_index(queries[i][0], queries[i][1], n))
+    if order == "odd_even":
+        # Sort queries by block number and right endpoint
+        return sorted(range(len(queries)), key=lambda i: (
+            queries[i][0] // block_size,  # Block of left endpoint
+            queries[i][1] if (queries[i][0] // block_size) % 2 == 0 else -queries[i][1]  # Right endpoint (ascending for even blocks, descending for odd)
+        ))
+    raise ValueError(f"unknown query order: {order!r}")
 
 # Mo's Algorithm implementation for iOS app usage personalization
-def mos_algorithm(events, queries):
-    # Number of events and block size for square root decomposition
+def mos_algorithm(events, queries, method="buckets", order="odd_even"):
+    """
+    Most used app in each inclusive [L, R] range of events; ties go to the
+    lexicographically smaller app id, and an empty range answers "None".
+
+    method="buckets" keeps apps grouped by their current count (frequency of
+    frequencies), so add and remove are O(1) and the mode only needs a scan of
+    the tied apps once per query. method="rollback" only ever adds events and
+    undoes the left part of each query, which keeps the mode exact in O(1).
+    order="hilbert" visits queries along a Hilbert curve instead of odd-even
+    blocks (the rollback method always uses its own block order).
+    """
+    # Number of events and block size: N / sqrt(Q) minimises total pointer moves
     N = len(events)
-    block_size = math.isqrt(N)
-    
-    # Add and remove functions for maintaining frequency counts
-    freq = defaultdict(int)  # Tracks app frequency in current range
-    max_app = None  # Tracks app with max frequency
+    block_size = max(1, N // max(1, math.isqrt(len(queries))))
+    names, apps = _encode_apps(events)
+    if method == "rollback":
+        return _mos_rollback(names, apps, queries, block_size)
+    if method != "buckets":
+        raise ValueError(f"unknown method: {method!r}")
+
+    freq = [0] * len(names)  # Tracks app frequency in current range
+    buckets = [set()]  # buckets[f] = apps whose frequency is exactly f
     max_freq = 0    # Tracks max frequency
-    
+
     def add(index):
-        nonlocal max_app, max_freq
-        app = events[index]
-        freq[app] += 1
-        # Update max_app if this app's frequency is higher
-        if freq[app] > max_freq:
-            max_freq = freq[app]
-            max_app = app
-        elif freq[app] == max_freq and (max_app is None or app < max_app):
-            # Break ties by choosing lexicographically smaller app_id
-            max_app = app
-    
+        nonlocal max_freq
+        app = apps[index]
+        count = freq[app]
+        if count:
+            buckets[count].discard(app)
+        count += 1
+        freq[app] = count
+        if count == len(buckets):
+            buckets.append(set())
+        buckets[count].add(app)
+        if count > max_freq:
+            max_freq = count
+
     def remove(index):
-        nonlocal max_app, max_freq
-        app = events[index]
-        freq[app] -= 1
-        # If the removed app was the max, recompute max_app
-        if freq[app] < max_freq:
-            # Find new max using a heap for efficiency
-            if freq[app] == 0:
-                del freq[app]
-            max_freq_new = 0
-            max_app_new = None
-            for app, count in freq.items():
-                if count > max_freq_new:
-                    max_freq_new = count
-                    max_app_new = app
-                elif count == max_freq_new and (max_app_new is None or app < max_app_new):
-                    max_app_new = app
-            max_freq = max_freq_new
-            max_app = max_app_new
-    
-    # Sort queries by block number and right endpoint
-    sorted_queries = sorted(enumerate(queries), key=lambda x: (
-        x[1][0] // block_size,  # Block of left endpoint
-        x[1][1] if (x[1][0] // block_size) % 2 == 0 else -x[1][1]  # Right endpoint (ascending for even blocks, descending for odd)
-    ))
-    
+        nonlocal max_freq
+        app = apps[index]
+        count = freq[app]
+        buckets[count].discard(app)
+        # The app drops to count - 1, so the max can only fall by one
+        if count == max_freq and not buckets[count]:
+            max_freq -= 1
+        count -= 1
+        freq[app] = count
+        if count:
+            buckets[count].add(app)
+
     # Process queries using Mo's Algorithm
     answers = [None] * len(queries)  # Store results in original query order
     cur_l, cur_r = 0, -1  # Current range [cur_l, cur_r]
-    
-    for query_idx, (l, r) in sorted_queries:
-        # Adjust left pointer
-        while cur_l < l:
-            remove(cur_l)
-            cur_l += 1
+
+    for query_idx in _mos_order(queries, block_size, N, order):
+        l, r = queries[query_idx]
+        if l > r:
+            answers[query_idx] = "None"  # Empty range; leave the pointers where they are
+            continue
+        # Extend before shrinking so the range never goes negative
         while cur_l > l:
             cur_l -= 1
             add(cur_l)
-        # Adjust right pointer
         while cur_r < r:
             cur_r += 1
             add(cur_r)
+        while cur_l < l:
+            remove(cur_l)
+            cur_l += 1
         while cur_r > r:
             remove(cur_r)
             cur_r -= 1
         # Store result for this query
-        answers[query_idx] = max_app if max_app is not None else "None"
-    
+        answers[query_idx] = names[min(buckets[max_freq])] if max_freq else "None"
+
+    return answers
+
+def _mos_rollback(names, apps, queries, block_size):
+    """Mo's with rollback: ranges only grow, and the left part of each query is undone."""
+    freq = [0] * len(names)
+    best_freq, best_app = 0, -1
+
+    def add(app):
+        nonlocal best_freq, best_app
+        count = freq[app] + 1
+        freq[app] = count
+        if count > best_freq or (count == best_freq and app < best_app):
+            best_freq, best_app = count, app
+
+    answers = ["None"] * len(queries)
+    by_block = defaultdict(list)
+    for query_idx, (l, r) in enumerate(queries):
+        if l > r:
+            continue
+        if l // block_size == r // block_size:
+            # Short query: count it directly, then undo
+            for i in range(l, r + 1):
+                add(apps[i])
+            answers[query_idx] = names[best_app]
+            for i in range(l, r + 1):
+                freq[apps[i]] -= 1
+            best_freq, best_app = 0, -1
+        else:
+            by_block[l // block_size].append(query_idx)
+
+    for block, block_queries in by_block.items():
+        block_queries.sort(key=lambda i: queries[i][1])
+        boundary = (block + 1) * block_size  # First event after the left block
+        cur_r = boundary - 1
+        for query_idx in block_queries:
+            l, r = queries[query_idx]
+            while cur_r < r:
+                cur_r += 1
+                add(apps[cur_r])
+            saved = (best_freq, best_app)
+            for i in range(l, boundary):
+                add(apps[i])
+            answers[query_idx] = names[best_app]
+            # Roll back the left part; the right part is reused by the next query
+            for i in range(l, boundary):
+                freq[apps[i]] -= 1
+            best_freq, best_app = saved
+        for i in range(boundary, cur_r + 1):
+            freq[apps[i]] -= 1
+        best_freq, best_app = 0, -1
+
+    return answers
+
+def encode_events(events):
+    """
+    Encode app ids to dense ints (sorted, so id order is lexicographic order).
+    Returns:
+        (names, codes): names[i] is the app for id i; codes is the compact
+        uint16/int32 event array.
+    """
+    names, codes = np.unique(np.asarray(events), return_inverse=True)
+    dtype = np.uint16 if len(names) <= np.iinfo(np.uint16).max else np.int32
+    return names.tolist(), codes.astype(dtype)
+
+def _top_k_counts(counts, k):
+    """(id, count) for the k largest nonzero counts; ties go to the smaller id."""
+    nonzero = np.count_nonzero(counts)
+    if nonzero == 0:
+        return []
+    k = min(k, nonzero)
+    # Everything tied with the k-th largest count is a candidate, so ties stay exact
+    threshold = np.partition(counts, len(counts) - k)[len(counts) - k]
+    candidates = np.flatnonzero(counts >= max(threshold, 1))
+    best = candidates[np.lexsort((candidates, -counts[candidates]))[:k]]
+    return list(zip(best.tolist(), counts[best].tolist()))
+
+def mos_top_k(events, queries, k=8, order="odd_even"):
+    """
+    Top k (app, count) pairs for each inclusive [L, R] range, most used first.
+
+    Events are integer-encoded and the current range's counts live in one
+    NumPy array. Each pointer move updates the counts with a single bincount
+    over the slice that entered or left the range, rather than one dict
+    update per event.
+    Args:
+        events: app ids, or the (names, codes) pair from encode_events.
+    """
+    names, codes = events if isinstance(events, tuple) else encode_events(events)
+    N = len(codes)
+    D = len(names)
+    block_size = max(1, N // max(1, math.isqrt(len(queries))))
+    counts = np.zeros(D, dtype=np.int64)
+
+    answers = [None] * len(queries)
+    cur_l, cur_r = 0, -1  # Current range [cur_l, cur_r]
+    for query_idx in _mos_order(queries, block_size, N, order):
+        l, r = queries[query_idx]
+        if l > r:
+            answers[query_idx] = []
+            continue
+        if l > cur_r or r < cur_l:
+            # No overlap: recount the new range from scratch
+            counts = np.bincount(codes[l:r + 1], minlength=D)
+        else:
+            if l < cur_l:
+                counts += np.bincount(codes[l:cur_l], minlength=D)
+            elif l > cur_l:
+                counts -= np.bincount(codes[cur_l:l], minlength=D)
+            if r > cur_r:
+                counts += np.bincount(codes[cur_r + 1:r + 1], minlength=D)
+            elif r < cur_r:
+                counts -= np.bincount(codes[r + 1:cur_r + 1], minlength=D)
+        cur_l, cur_r = l, r
+        answers[query_idx] = [(names[app], count) for app, count in _top_k_counts(counts, k)]
     return answers
 
 # Example usage for iOS personalization
@@ -97,5 +254,13 @@ def main():
     for i, (l, r) in enumerate(queries):
         print(f"Range [{l}, {r}]: {results[i]}")
 
+    # Same answers from the rollback variant and from Hilbert query ordering
+    assert mos_algorithm(events, queries, method="rollback") == results
+    assert mos_algorithm(events, queries, order="hilbert") == results
+
+    # Top 3 apps per range, e.g. to fill a dock of suggestions
+    for (l, r), top in zip(queries, mos_top_k(events, queries, k=3)):
+        print(f"Range [{l}, {r}] top 3: {top}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,214 @@
+import heapq
+import time
+from collections import Counter, deque
+
+# Online counterpart to mos_algorithm: answers "top apps in the last N events
+# or T seconds" at any moment, without the event log or the queries up front.
+
+def _rank(counts, k):
+    """Top k (app, count) pairs, most used first; ties go to the lexicographically smaller app."""
+    return heapq.nsmallest(k, counts.items(), key=lambda item: (-item[1], item[0]))
+
+class SlidingWindowTopApps:
+    """
+    Exact top apps over a sliding window of the last max_events events and/or
+    the last max_seconds seconds. Apps are grouped by their current count
+    (frequency of frequencies), so each arrival and each expiry is O(1).
+    """
+    def __init__(self, max_events=None, max_seconds=None, clock=time.monotonic):
+        if max_events is None and max_seconds is None:
+            raise ValueError("set max_events, max_seconds or both")
+        self.max_events = max_events
+        self.max_seconds = max_seconds
+        self.clock = clock
+        self.events = deque()  # (timestamp, app) in arrival order
+        self.counts = {}  # app -> count in the window
+        self.buckets = {}  # count -> set of apps with exactly that count
+        self.max_freq = 0
+
+    def _increment(self, app):
+        count = self.counts.get(app, 0)
+        if count:
+            self.buckets[count].discard(app)
+        count += 1
+        self.counts[app] = count
+        self.buckets.setdefault(count, set()).add(app)
+        if count > self.max_freq:
+            self.max_freq = count
+
+    def _decrement(self, app):
+        count = self.counts[app]
+        bucket = self.buckets[count]
+        bucket.discard(app)
+        if not bucket:
+            del self.buckets[count]
+            # The app drops to count - 1, so the max can only fall by one
+            if count == self.max_freq:
+                self.max_freq -= 1
+        count -= 1
+        if count:
+            self.counts[app] = count
+            self.buckets.setdefault(count, set()).add(app)
+        else:
+            del self.counts[app]
+
+    def expire(self, now=None):
+        """Drop events that have left the window."""
+        while self.max_events is not None and len(self.events) > self.max_events:
+            self._decrement(self.events.popleft()[1])
+        if self.max_seconds is not None:
+            cutoff = (self.clock() if now is None else now) - self.max_seconds
+            while self.events and self.events[0][0] <= cutoff:
+                self._decrement(self.events.popleft()[1])
+
+    def add(self, app, timestamp=None):
+        """Record one usage event (timestamps must be non-decreasing)."""
+        timestamp = self.clock() if timestamp is None else timestamp
+        self.events.append((timestamp, app))
+        self._increment(app)
+        self.expire(timestamp)
+
+    def top(self, k=1, now=None):
+        """Top k (app, count) pairs in the window as of now (defaults to the clock)."""
+        self.expire(now)
+        if self.max_freq == 0:
+            return []
+        if k == 1:
+            app = min(self.buckets[self.max_freq])
+            return [(app, self.max_freq)]
+        return _rank(self.counts, k)
+
+    def __len__(self):
+        return len(self.events)
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters in `capacity` counters. When a new app arrives
+    and every counter is taken, it replaces an app with the minimum count and
+    inherits that count as its error bound. Counts are grouped by value so the
+    minimum is found in O(1).
+    """
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.counts = {}  # app -> estimated count (never an underestimate)
+        self.errors = {}  # app -> maximum overestimate
+        self.buckets = {}  # count -> set of apps with exactly that count
+        self.min_freq = 0
+
+    def _move(self, app, old, new):
+        if old:
+            bucket = self.buckets[old]
+            bucket.discard(app)
+            if not bucket:
+                del self.buckets[old]
+                if old == self.min_freq:
+                    self.min_freq = new  # new == old + 1, the next occupied count
+        self.counts[app] = new
+        self.buckets.setdefault(new, set()).add(app)
+
+    def offer(self, app):
+        count = self.counts.get(app)
+        if count is not None:
+            self._move(app, count, count + 1)
+        elif len(self.counts) < self.capacity:
+            self.errors[app] = 0
+            self._move(app, 0, 1)
+            self.min_freq = 1
+        else:
+            floor = self.min_freq
+            victim = self.buckets[floor].pop()
+            if not self.buckets[floor]:
+                del self.buckets[floor]
+            del self.counts[victim]
+            del self.errors[victim]
+            self.errors[app] = floor
+            self.counts[app] = floor + 1
+            self.buckets.setdefault(floor + 1, set()).add(app)
+            if floor not in self.buckets:
+                self.min_freq = floor + 1
+
+    def top(self, k=1):
+        return _rank(self.counts, k)
+
+class HeavyHitterWindow:
+    """
+    Bounded-memory, approximate version of SlidingWindowTopApps.
+
+    The window is split into `panes` consecutive panes, each summarised by a
+    SpaceSaving sketch, and whole panes expire at once: memory is
+    O(panes * capacity) however many events arrive. The answer covers the
+    window plus at most one partly expired pane, and counts can be
+    overestimated by up to the sum of the pane error bounds.
+    """
+    def __init__(self, max_events=None, max_seconds=None, panes=8, capacity=64, clock=time.monotonic):
+        if max_events is None and max_seconds is None:
+            raise ValueError("set max_events, max_seconds or both")
+        self.max_events = max_events
+        self.max_seconds = max_seconds
+        self.pane_events = -(-max_events // panes) if max_events is not None else None
+        self.pane_seconds = max_seconds / panes if max_seconds is not None else None
+        self.capacity = capacity
+        self.clock = clock
+        self.panes = deque()  # [start timestamp, start event index, events, SpaceSaving]
+        self.total = 0  # Events seen so far
+
+    def expire(self, now=None):
+        """Drop the oldest pane once every event in it has left the window."""
+        while len(self.panes) > 1:
+            next_pane = self.panes[1]
+            if self.max_events is not None and next_pane[1] <= self.total - self.max_events:
+                self.panes.popleft()
+            elif self.max_seconds is not None and next_pane[0] <= (self.clock() if now is None else now) - self.max_seconds:
+                self.panes.popleft()
+            else:
+                break
+        if self.panes and self.max_seconds is not None:
+            # A pane that is entirely stale with nothing newer behind it
+            last = self.panes[-1]
+            if last[0] + self.pane_seconds <= (self.clock() if now is None else now) - self.max_seconds:
+                self.panes.clear()
+
+    def add(self, app, timestamp=None):
+        timestamp = self.clock() if timestamp is None else timestamp
+        pane = self.panes[-1] if self.panes else None
+        if (pane is None
+                or (self.pane_events is not None and pane[2] >= self.pane_events)
+                or (self.pane_seconds is not None and timestamp >= pane[0] + self.pane_seconds)):
+            pane = [timestamp, self.total, 0, SpaceSaving(self.capacity)]
+            self.panes.append(pane)
+        pane[2] += 1
+        pane[3].offer(app)
+        self.total += 1
+        self.expire(timestamp)
+
+    def top(self, k=1, now=None):
+        """Approximate top k (app, estimated count) pairs as of now."""
+        self.expire(now)
+        merged = Counter()
+        for pane in self.panes:
+            merged.update(pane[3].counts)
+        return _rank(merged, k)
+
+# Example usage for iOS personalization
+def main():
+    stream = [
+        (0.0, "Safari"), (1.0, "Messages"), (2.0, "Safari"), (3.0, "Notes"), (4.0, "Messages"),
+        (5.0, "Photos"), (6.0, "Safari"), (7.0, "Messages"), (8.0, "Notes"), (9.0, "Safari")
+    ]
+
+    # Exact top apps in the last 5 events and in the last 4 seconds
+    by_events = SlidingWindowTopApps(max_events=5)
+    by_time = SlidingWindowTopApps(max_seconds=4.0)
+    for timestamp, app in stream:
+        by_events.add(app, timestamp)
+        by_time.add(app, timestamp)
+        print(f"t={timestamp:.0f} {app:<8} last 5 events: {by_events.top(2)}  last 4s: {by_time.top(1, now=timestamp)}")
+
+    # Bounded memory: 4 panes of at most 3 counters each
+    approx = HeavyHitterWindow(max_events=5, panes=4, capacity=3)
+    for timestamp, app in stream:
+        approx.add(app, timestamp)
+    print("Approximate top 2 in the last ~5 events:", approx.top(2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import copy
+import time
+from collections import OrderedDict
+
+from trie import Trie
+from fuzzy_matching import FuzzyMatcher
+from tfidf import TFIDF
+
+class ResultCache:
+    """LRU cache with a per-entry TTL. Each entry also remembers the index
+    generation it was computed against and is treated as a miss once that changes.
+    Results are copied in and out, so callers may mutate what they get back."""
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, generation, results)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, cached_generation, results = entry
+            if cached_generation == generation and time.monotonic() < expires_at:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(results)
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, generation, results):
+        self.entries[key] = (time.monotonic() + self.ttl, generation, copy.deepcopy(results))
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+class SpotlightEngine:
+    """One ranked result list from prefix, fuzzy and full-text search.
+
+    The three stages score on unrelated scales, so their rankings are fused
+    with reciprocal rank fusion: each hit adds weight / (rrf_k + rank). Hits
+    for the same item are merged by metadata["path"] (falling back to the
+    name), so an app found by prefix and by typo-tolerant search ranks higher.
+    """
+
+    STAGES = ("prefix", "fuzzy", "fulltext")
+
+    def __init__(self, trie=None, matcher=None, tfidf=None, weights=None,
+                 rrf_k=60, max_distance=2, cache_size=1024, ttl=30.0):
+        self.trie = trie or Trie()
+        self.matcher = matcher or FuzzyMatcher()
+        self.tfidf = tfidf or TFIDF()
+        self.weights = weights or {"prefix": 1.0, "fuzzy": 0.8, "fulltext": 1.0}
+        self.rrf_k = rrf_k
+        self.max_distance = max_distance
+        self.cache = ResultCache(cache_size, ttl)
+        self.stage_calls = {stage: 0 for stage in self.STAGES}
+        self.stage_seconds = {stage: 0.0 for stage in self.STAGES}
+
+    def generation(self):
+        return (self.trie.generation, self.matcher.generation, self.tfidf.generation)
+
+    def _timed(self, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - start
+            self.stage_calls[stage] += 1
+
+    def search(self, query, k=20):
+        """Return up to k (name, {'score', 'metadata', 'sources'}) results, best first."""
+        normalized = " ".join(query.lower().split())
+        if not normalized:
+            return []
+        key = (normalized, k)
+        generation = self.generation()
+        results = self.cache.get(key, generation)
+        if results is not None:
+            return results
+
+        prefix_hits = self._timed("prefix", self.trie.top_k, normalized, k)
+        fuzzy_hits = self._timed("fuzzy", self.matcher.search, normalized, self.max_distance)[:k]
+        text_hits = self._timed("fulltext", self.tfidf.top_k, normalized, k)
+
+        fused = {}
+
+        def add(stage, rank, name, metadata):
+            item_key = metadata.get("path", name) if isinstance(metadata, dict) else name
+            entry = fused.get(item_key)
+            if entry is None:
+                entry = fused[item_key] = [name, {'score': 0.0, 'metadata': metadata, 'sources': []}]
+            entry[1]['score'] += self.weights[stage] / (self.rrf_k + rank)
+            entry[1]['sources'].append(stage)
+
+        for rank, (word, _, metadata) in enumerate(prefix_hits, 1):
+            add("prefix", rank, word, metadata)
+        for rank, (item, _, metadata) in enumerate(fuzzy_hits, 1):
+            add("fuzzy", rank, item, metadata)
+        for rank, (doc_id, data) in enumerate(text_hits, 1):
+            add("fulltext", rank, doc_id, data['metadata'])
+
+        results = [tuple(entry) for entry in fused.values()]
+        results.sort(key=lambda r: -r[1]['score'])
+        results = results[:k]
+        self.cache.put(key, generation, results)
+        return results
+
+    def stats(self):
+        """Cache hit/miss counts and per-stage call counts and mean latency (ms)."""
+        return {
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "stages": {
+                stage: {
+                    "calls": self.stage_calls[stage],
+                    "mean_ms": 1000 * self.stage_seconds[stage] / self.stage_calls[stage]
+                    if self.stage_calls[stage] else 0.0,
+                }
+                for stage in self.STAGES
+            },
+        }
+
+# Example usage
+if __name__ == "__main__":
+    engine = SpotlightEngine()
+    safari = {"type": "app", "path": "/Applications/Safari.app"}
+    sales = {"type": "folder", "path": "/Documents/Sales"}
+    engine.trie.insert("Safari", safari, score=9.0)
+    engine.trie.insert("Sales", sales, score=5.0)
+    engine.matcher.add_item("Safari", safari)
+    engine.matcher.add_item("Sales", sales)
+    engine.tfidf.add_document("sales-notes", "sales pipeline notes", {"type": "txt", "path": "/Documents/Sales/notes.txt"})
+
+    # Simulate typing: repeated prefixes are served from the cache
+    for query in ["sa", "saf", "sa", "sales", "sa"]:
+        results = engine.search(query, k=3)
+        print(f"{query!r}: {[(name, round(data['score'], 4), data['sources']) for name, data in results]}")
+
+    # Any index change bumps the generation and invalidates cached results
+    engine.trie.insert("Sample.pdf", {"type": "pdf", "path": "/Documents/Sample.pdf"}, score=2.0)
+    print(f"'sa' after insert: {[name for name, _ in engine.search('sa', k=3)]}")
+    print(engine.stats())
@@ -0,0 +1,746 @@
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from itertools import islice
+import numpy as np
+
+from tfidf import TFIDF
+from trie import Trie
+
+# Segment file layout (native byte order, every section 8-byte aligned):
+#   magic (8s) | version (I) | section count (I) | section table: (offset Q, length Q) * N
+#   followed by the sections below, in this order.
+MAGIC = b"SPSEG\x00\x00\x01"
+VERSION = 2
+SECTIONS = [
+    ("doc_lengths", "I"),        # terms per document, by ordinal
+    ("doc_offsets", "Q"),        # n_docs + 1 offsets into doc_blob
+    ("doc_blob", "B"),           # JSON [doc_id, metadata] per document
+    ("term_offsets", "Q"),       # n_terms + 1 offsets into term_blob
+    ("term_blob", "B"),          # UTF-8 terms, sorted (byte order == code point order)
+    ("posting_offsets", "Q"),    # n_terms + 1 offsets into the posting columns
+    ("posting_docs", "I"),       # doc ordinals, ascending within each term
+    ("posting_counts", "I"),     # term counts
+    ("term_max_tf", "d"),        # highest term_count / doc_length per term
+    ("trie_label_offsets", "Q"), # n_nodes + 1 offsets into trie_labels
+    ("trie_labels", "B"),        # UTF-8 edge labels
+    ("trie_child_start", "I"),   # nodes in BFS order: children are contiguous
+    ("trie_child_count", "I"),
+    ("trie_score", "d"),
+    ("trie_best", "d"),
+    ("trie_is_end", "B"),
+    ("trie_meta_offsets", "Q"),  # n_nodes + 1 offsets into trie_meta
+    ("trie_meta", "B"),          # JSON metadata for word-ending nodes
+    ("doc_id_hashes", "Q"),      # _doc_key of every document, sorted
+    ("doc_id_ordinals", "I"),    # ordinal of the document with that hash
+]
+_HEADER = struct.Struct("8sII")
+_ENTRY = struct.Struct("QQ")
+
+def _offsets(chunks):
+    """Prefix-sum offsets (n + 1 entries) for a list of byte strings."""
+    offsets = array('Q', [0])
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        offsets.append(total)
+    return offsets
+
+def _doc_key(doc_id):
+    """64-bit hash of a doc_id, used to find its ordinal in a segment."""
+    digest = hashlib.blake2b(json.dumps(doc_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def _write_sections(path, payloads):
+    """Write the section payloads (bytes-like, in SECTIONS order) to path atomically."""
+    table_size = _HEADER.size + _ENTRY.size * len(SECTIONS)
+    position = (table_size + 7) & ~7
+    entries = []
+    for payload in payloads:
+        entries.append((position, len(payload)))
+        position = (position + len(payload) + 7) & ~7
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(SECTIONS)))
+        for entry in entries:
+            f.write(_ENTRY.pack(*entry))
+        for (offset, _), payload in zip(entries, payloads):
+            f.write(b"\x00" * (offset - f.tell()))
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _flatten_trie(trie):
+    """Lay out a Trie's nodes in BFS order so each node's children are contiguous."""
+    nodes = [trie.root]
+    child_start = array('I')
+    child_count = array('I')
+    i = 0
+    while i < len(nodes):
+        children = sorted(nodes[i].children.items())
+        child_start.append(len(nodes))
+        child_count.append(len(children))
+        nodes.extend(child for _, child in children)
+        i += 1
+    labels = [node.label.encode() for node in nodes]
+    metas = [json.dumps(node.metadata).encode() if node.is_end else b"" for node in nodes]
+    return [
+        _offsets(labels), b"".join(labels), child_start, child_count,
+        array('d', (node.score for node in nodes)),
+        array('d', (node.best for node in nodes)),
+        array('B', (node.is_end for node in nodes)),
+        _offsets(metas), b"".join(metas),
+    ]
+
+def _write_segment(path, docs, doc_lengths, postings, trie):
+    """docs: [(doc_id, metadata)]; postings: {term: (docs, counts, max_tf)}."""
+    doc_chunks = [json.dumps([doc_id, metadata]).encode() for doc_id, metadata in docs]
+    terms = sorted(postings, key=lambda t: t.encode())
+    term_chunks = [term.encode() for term in terms]
+    posting_offsets = array('Q', [0])
+    posting_docs = array('I')
+    posting_counts = array('I')
+    max_tf = array('d')
+    for term in terms:
+        term_docs, term_counts, term_max_tf = postings[term]
+        # Columns may be arrays, memoryviews or NumPy arrays: copy them as raw uint32 bytes
+        posting_docs.frombytes(memoryview(term_docs).cast('B'))
+        posting_counts.frombytes(memoryview(term_counts).cast('B'))
+        posting_offsets.append(len(posting_docs))
+        max_tf.append(term_max_tf)
+    keys = np.array([_doc_key(doc_id) for doc_id, _ in docs], dtype=np.uint64)
+    by_key = np.argsort(keys, kind='stable')
+    payloads = [
+        array('I', doc_lengths), _offsets(doc_chunks), b"".join(doc_chunks),
+        _offsets(term_chunks), b"".join(term_chunks),
+        posting_offsets, posting_docs, posting_counts, max_tf,
+    ] + _flatten_trie(trie or Trie()) + [
+        keys[by_key].tobytes(), by_key.astype(np.uint32).tobytes(),
+    ]
+    _write_sections(path, [bytes(p) if isinstance(p, array) else p for p in payloads])
+
+def write_segment(path, tfidf=None, trie=None):
+    """Freeze an in-memory TFIDF and/or Trie into an immutable segment file.
+
+    Tombstoned documents are dropped and the live ones renumbered densely.
+    """
+    tfidf = tfidf or TFIDF()
+    alive = np.frombuffer(tfidf.alive, dtype=np.uint8).astype(bool)
+    remap = (np.cumsum(alive) - 1).astype(np.uint32)
+    postings = {}
+    for term, plist in tfidf.index.items():
+        docs = np.frombuffer(plist.docs, dtype=np.uint32)
+        counts = np.frombuffer(plist.counts, dtype=np.uint32)
+        keep = alive[docs]
+        postings[term] = (remap[docs[keep]], np.ascontiguousarray(counts[keep]), tfidf.max_tf[term])
+    docs = [doc for doc in tfidf.docs if doc is not None]
+    lengths = np.frombuffer(tfidf.doc_lengths, dtype=np.uint32)[alive]
+    _write_segment(path, docs, array('I', lengths.tobytes()), postings, trie)
+
+class Segment:
+    """Read-only view of a segment file.
+
+    The file is mmap'ed and every column is a memoryview cast over the mapping,
+    so opening is O(sections) and processes opening the same file share pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or count != len(SECTIONS):
+            raise ValueError(f"{path} is not a version {VERSION} segment")
+        self._columns = []
+        for i, (name, fmt) in enumerate(SECTIONS):
+            offset, length = _ENTRY.unpack_from(self._mmap, _HEADER.size + i * _ENTRY.size)
+            column = self._view[offset:offset + length].cast(fmt)
+            self._columns.append(column)
+            setattr(self, name, column)
+        self.doc_count = len(self.doc_lengths)
+        self.term_count = len(self.term_offsets) - 1
+        # Documents replaced or removed after this segment was written. The file
+        # stays immutable; SegmentedIndex persists these in its MANIFEST.
+        self.deleted = np.zeros(self.doc_count, dtype=bool)
+        self.deleted_count = 0
+        self.readers = 0  # Reader snapshots currently using this segment
+
+    @property
+    def live_count(self):
+        return self.doc_count - self.deleted_count
+
+    def find_doc(self, doc_id):
+        """Ordinal of doc_id in this segment, or -1."""
+        key = _doc_key(doc_id)
+        hashes = np.frombuffer(self.doc_id_hashes, dtype=np.uint64)
+        i = int(np.searchsorted(hashes, np.uint64(key)))
+        while i < len(hashes) and int(hashes[i]) == key:
+            ordinal = self.doc_id_ordinals[i]
+            if self.doc(ordinal)[0] == doc_id:
+                return ordinal
+            i += 1  # Hash collision with another doc_id
+        return -1
+
+    def delete(self, ordinal):
+        """Mark a document as deleted; returns False if it already was."""
+        if self.deleted[ordinal]:
+            return False
+        self.deleted[ordinal] = True
+        self.deleted_count += 1
+        return True
+
+    def close(self):
+        for column in self._columns:
+            column.release()
+        self._view.release()
+        self._mmap.close()
+
+    # --- Term dictionary and postings ---
+
+    def _term(self, i):
+        return bytes(self.term_blob[self.term_offsets[i]:self.term_offsets[i + 1]])
+
+    def _find_term(self, term):
+        """Binary search the sorted term dictionary; returns the term number or -1."""
+        key = term.encode()
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.term_count and self._term(lo) == key else -1
+
+    def terms(self):
+        for i in range(self.term_count):
+            yield self._term(i).decode()
+
+    def postings(self, term):
+        """Return (docs, counts, max_tf) views for term, or None."""
+        i = self._find_term(term)
+        if i < 0:
+            return None
+        lo, hi = self.posting_offsets[i], self.posting_offsets[i + 1]
+        return self.posting_docs[lo:hi], self.posting_counts[lo:hi], self.term_max_tf[i]
+
+    def doc(self, ordinal):
+        """Decode (doc_id, metadata) for a document on demand."""
+        lo, hi = self.doc_offsets[ordinal], self.doc_offsets[ordinal + 1]
+        doc_id, metadata = json.loads(bytes(self.doc_blob[lo:hi]))
+        return doc_id, metadata
+
+    # --- Trie ---
+
+    def _label(self, node):
+        return bytes(self.trie_labels[self.trie_label_offsets[node]:self.trie_label_offsets[node + 1]]).decode()
+
+    def _metadata(self, node):
+        lo, hi = self.trie_meta_offsets[node], self.trie_meta_offsets[node + 1]
+        return json.loads(bytes(self.trie_meta[lo:hi]))
+
+    def _children(self, node):
+        start = self.trie_child_start[node]
+        return range(start, start + self.trie_child_count[node])
+
+    def _find(self, prefix):
+        """Same walk as Trie._find over the flattened node arrays."""
+        node = 0
+        i = 0
+        while i < len(prefix):
+            for child in self._children(node):
+                label = self._label(child)
+                if label[0] == prefix[i]:
+                    break
+            else:
+                return None, None
+            rest = prefix[i:i + len(label)]
+            if not label.startswith(rest):
+                return None, None
+            node = child
+            i += len(rest)
+            if len(rest) < len(label):
+                return node, label[len(rest):]
+        return node, ""
+
+    def _walk(self, node, word):
+        """Yield (word, score, node) for every word at or below node."""
+        stack = [(node, word)]
+        while stack:
+            node, word = stack.pop()
+            if self.trie_is_end[node]:
+                yield word, self.trie_score[node], node
+            for child in reversed(self._children(node)):
+                stack.append((child, word + self._label(child)))
+
+    def search_prefix(self, prefix):
+        node, tail = self._find(prefix.lower())
+        if node is None:
+            return []
+        return [(word, self._metadata(n)) for word, _, n in self._walk(node, prefix + tail)]
+
+    def has_word(self, word):
+        node, tail = self._find(word.lower())
+        return node is not None and tail == "" and bool(self.trie_is_end[node])
+
+    def iter_ranked(self, prefix):
+        """Trie.iter_ranked over the mmap'ed node arrays (same best-first search)."""
+        node, tail = self._find(prefix.lower())
+        if node is None:
+            return
+        counter = 0
+        heap = [(-self.trie_best[node], counter, False, node, prefix + tail)]
+        while heap:
+            neg_score, _, is_word, node, word = heapq.heappop(heap)
+            if is_word:
+                yield word, -neg_score, self._metadata(node)
+                continue
+            if self.trie_is_end[node]:
+                counter += 1
+                heapq.heappush(heap, (-self.trie_score[node], counter, True, node, word))
+            for child in self._children(node):
+                counter += 1
+                heapq.heappush(heap, (-self.trie_best[child], counter, False, child, word + self._label(child)))
+
+    def top_k_prefix(self, prefix, k=10):
+        return list(islice(self.iter_ranked(prefix), max(k, 0)))
+
+    def words(self):
+        """Yield (word, score, metadata) for every word in the segment's trie."""
+        for word, score, node in self._walk(0, ""):
+            yield word, score, self._metadata(node)
+
+def _merge_segments(path, segments, deleted):
+    """Write the live documents of `segments` (minus the `deleted` masks) to one segment at path.
+
+    Returns, per segment, the array mapping its ordinals to merged ordinals.
+    """
+    docs = []
+    doc_lengths = array('I')
+    postings = {}  # term -> ([docs arrays], [counts arrays], max_tf)
+    remaps = []
+    trie = Trie()
+    for segment, dead in zip(segments, deleted):
+        keep = ~dead
+        remap = (len(docs) + np.cumsum(keep) - 1).astype(np.uint32)
+        remaps.append(remap)
+        docs.extend(segment.doc(i) for i in np.flatnonzero(keep).tolist())
+        doc_lengths.frombytes(np.frombuffer(segment.doc_lengths, dtype=np.uint32)[keep].tobytes())
+        for term in segment.terms():
+            seg_docs, seg_counts, seg_max_tf = segment.postings(term)
+            seg_docs = np.frombuffer(seg_docs, dtype=np.uint32)
+            seg_counts = np.frombuffer(seg_counts, dtype=np.uint32)
+            live = keep[seg_docs]
+            if not live.any():
+                continue
+            entry = postings.setdefault(term, ([], [], 0.0))
+            entry[0].append(remap[seg_docs[live]])
+            entry[1].append(seg_counts[live])
+            if seg_max_tf > entry[2]:
+                postings[term] = (entry[0], entry[1], seg_max_tf)
+        # Later segments win for words present in several
+        for word, score, metadata in segment.words():
+            trie.insert(word, metadata, score)
+    postings = {
+        term: (np.concatenate(d), np.concatenate(c), m)
+        for term, (d, c, m) in postings.items()
+    }
+    _write_segment(path, docs, doc_lengths, postings, trie)
+    return remaps
+
+class _BufferView:
+    """Adapts an in-memory TFIDF buffer to the Segment postings/doc interface.
+
+    `hidden` holds ordinals superseded since the buffer was detached for a flush.
+    """
+
+    def __init__(self, tfidf, hidden=()):
+        # Hold the current columns: the live buffer may append to them, or
+        # compact() may replace them, while this snapshot is being read
+        self.index = tfidf.index
+        self.dead = tfidf.dead
+        self.max_tf = tfidf.max_tf
+        self.docs = list(tfidf.docs)
+        self.alive = np.frombuffer(tfidf.alive, dtype=np.uint8).astype(bool)
+        if hidden:
+            self.alive[list(hidden)] = False
+        self.hidden = bool(hidden)
+        self.doc_count = tfidf.doc_count - len(hidden)
+        self.doc_lengths = np.frombuffer(tfidf.doc_lengths, dtype=np.uint32).copy()
+
+    def postings(self, term):
+        plist = self.index.get(term)
+        if plist is None:
+            return None
+        # Copies: the live buffer may grow (and reallocate) while this query runs
+        docs = np.array(plist.docs, dtype=np.uint32)
+        end = np.searchsorted(docs, len(self.alive))  # Skip documents added after the snapshot
+        docs = docs[:end]
+        counts = np.array(plist.counts, dtype=np.uint32)[:end]
+        if not len(docs):
+            return None
+        if self.dead.get(term) or self.hidden:
+            # Hide tombstones the buffer has not cleaned up yet
+            keep = self.alive[docs]
+            docs, counts = docs[keep], counts[keep]
+            if not len(docs):
+                return None
+        return docs, counts, self.max_tf.get(term, 0.0)
+
+    def doc(self, ordinal):
+        return self.docs[ordinal]
+
+class _Flushing:
+    """A buffer detached by flush() while its segment is being written."""
+
+    def __init__(self, tfidf, trie):
+        self.tfidf = tfidf
+        self.trie = trie
+        self.hidden = set()  # Ordinals replaced or removed during the write
+        self.superseded = set()  # Their doc_ids, to delete in the new segment
+
+class SegmentedIndex:
+    """A directory of immutable segments plus an in-memory write buffer.
+
+    New documents and words go into a TFIDF/Trie buffer; flush() freezes the
+    buffer into a fresh segment, and merge() (or start_merge() in a background
+    thread) compacts all current segments into one. Adding a doc_id that an
+    older segment holds marks the old copy deleted, so a document is only ever
+    counted once. The MANIFEST file lists the live segments and their deleted
+    ordinals and is replaced atomically, so readers never see a half-written
+    index; deletes become durable with the flush that writes their new copy.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._merge_thread = None
+        self._merging = False  # Set under self._lock while a merge runs, so merges never overlap
+        self.buffer = TFIDF()
+        self.trie_buffer = Trie()
+        self._flushing = []  # _Flushing buffers, oldest first
+        self._retired = []  # Segments merged away, closed once no reader uses them
+        manifest = self._read_manifest()
+        self._next_id = manifest["next_id"]
+        self.segments = [Segment(os.path.join(directory, name)) for name in manifest["segments"]]
+        deleted = manifest.get("deleted", {})
+        for segment in self.segments:
+            for ordinal in deleted.get(os.path.basename(segment.path), ()):
+                segment.delete(ordinal)
+
+    # --- Manifest ---
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "MANIFEST")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"segments": [], "next_id": 0}
+
+    def _write_manifest(self):
+        names = [os.path.basename(segment.path) for segment in self.segments]
+        deleted = {
+            os.path.basename(segment.path): np.flatnonzero(segment.deleted).tolist()
+            for segment in self.segments if segment.deleted_count
+        }
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segments": names, "next_id": self._next_id, "deleted": deleted}, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _new_segment_path(self):
+        # Called with self._lock held
+        name = f"seg_{self._next_id:06d}.seg"
+        self._next_id += 1
+        return os.path.join(self.directory, name)
+
+    # --- Writes ---
+
+    def _supersede(self, doc_id):
+        """Hide every flushed or flushing copy of doc_id (called with self._lock held)."""
+        found = False
+        for segment in self.segments:
+            ordinal = segment.find_doc(doc_id)
+            if ordinal >= 0:
+                found |= segment.delete(ordinal)
+        for flushing in self._flushing:
+            ordinal = flushing.tfidf.doc_ordinal.get(doc_id)
+            if ordinal is not None and ordinal not in flushing.hidden:
+                flushing.hidden.add(ordinal)
+                flushing.superseded.add(doc_id)
+                found = True
+        return found
+
+    def add_document(self, doc_id, content, metadata=None):
+        """Index a document; an existing doc_id (buffered or flushed) is replaced."""
+        with self._lock:
+            self._supersede(doc_id)
+            self.buffer.add_document(doc_id, content, metadata)
+
+    def remove_document(self, doc_id):
+        with self._lock:
+            found = self._supersede(doc_id)
+            return self.buffer.remove_document(doc_id) or found
+
+    def insert(self, word, metadata=None, score=0.0):
+        with self._lock:
+            self.trie_buffer.insert(word, metadata, score)
+
+    def flush(self):
+        """Write the buffered documents and words to a new segment."""
+        with self._lock:
+            if not self.buffer.docs and not self.trie_buffer.root.children and not self.trie_buffer.root.is_end:
+                self._write_manifest()  # Still persist removals of flushed documents
+                return None
+            # Detach the buffer first: writes that arrive during the flush go to a fresh
+            # one, while readers keep seeing the detached copy until its segment is live
+            flushing = _Flushing(self.buffer, self.trie_buffer)
+            self._flushing.append(flushing)
+            self.buffer = TFIDF()
+            self.trie_buffer = Trie()
+            path = self._new_segment_path()
+        write_segment(path, flushing.tfidf, flushing.trie)
+        segment = Segment(path)
+        with self._lock:
+            for doc_id in flushing.superseded:
+                ordinal = segment.find_doc(doc_id)
+                if ordinal >= 0:
+                    segment.delete(ordinal)
+            self.segments = self.segments + [segment]
+            self._flushing.remove(flushing)
+            self._write_manifest()
+        return path
+
+    def merge(self):
+        """Compact all current segments into a single segment, dropping deleted documents.
+
+        Returns the new segment's path, or None if there was nothing to merge or
+        another merge is already running.
+        """
+        with self._lock:
+            if self._merging:
+                return None
+            self._merging = True
+        try:
+            return self._merge()
+        finally:
+            with self._lock:
+                self._merging = False
+
+    def _merge(self):
+        with self._lock:
+            merging = list(self.segments)
+            if len(merging) < 2:
+                return None
+            snapshots = [segment.deleted.copy() for segment in merging]
+            for segment in merging:
+                segment.readers += 1
+            path = self._new_segment_path()
+        try:
+            remaps = _merge_segments(path, merging, snapshots)
+            merged = Segment(path)
+        finally:
+            with self._lock:
+                for segment in merging:
+                    segment.readers -= 1
+        with self._lock:
+            # Carry over deletes that happened while the merge was running
+            for segment, deleted, remap in zip(merging, snapshots, remaps):
+                for ordinal in np.flatnonzero(segment.deleted & ~deleted).tolist():
+                    merged.delete(int(remap[ordinal]))
+            remaining = [segment for segment in self.segments if segment not in merging]
+            self.segments = [merged] + remaining
+            self._write_manifest()
+            self._retired.extend(merging)
+            self._close_retired()
+        # Open mappings stay valid after unlink on POSIX, so retired segments still being read are safe
+        for segment in merging:
+            os.remove(segment.path)
+        return path
+
+    def start_merge(self):
+        """Run merge() on a background thread.
+
+        Returns the thread, or None if a merge (background or foreground) is already running.
+        """
+        with self._lock:
+            if self._merging:
+                return None
+            self._merging = True
+
+        def run():
+            try:
+                self._merge()
+            finally:
+                with self._lock:
+                    self._merging = False
+
+        self._merge_thread = threading.Thread(target=run, daemon=True)
+        self._merge_thread.start()
+        return self._merge_thread
+
+    # --- Reads ---
+
+    def _close_retired(self):
+        """Close retired segments no reader snapshot still holds (called with self._lock held)."""
+        still_read = []
+        for segment in self._retired:
+            if segment.readers:
+                still_read.append(segment)
+            else:
+                segment.close()
+        self._retired = still_read
+
+    def _acquire(self):
+        """Snapshot the current sources, pinning their segments until _release()."""
+        with self._lock:
+            segments = list(self.segments)
+            for segment in segments:
+                segment.readers += 1
+            buffers = [_BufferView(f.tfidf, f.hidden) for f in self._flushing] + [_BufferView(self.buffer)]
+            tries = [f.trie for f in self._flushing] + [self.trie_buffer]
+        return segments, buffers, tries
+
+    def _release(self, segments):
+        with self._lock:
+            for segment in segments:
+                segment.readers -= 1
+            if self._retired:
+                self._close_retired()
+
+    def _score(self, sources, query):
+        """Vectorised TF-IDF per source with corpus-wide N and df, skipping deleted documents."""
+        doc_count = sum(source.live_count if isinstance(source, Segment) else source.doc_count
+                        for source in sources)
+        query_terms = query.lower().split()
+        per_term = {}  # term -> [(source index, docs, counts)]
+        for term in set(query_terms):
+            for s, source in enumerate(sources):
+                hit = source.postings(term)
+                if hit is None:
+                    continue
+                docs = np.frombuffer(hit[0], dtype=np.uint32)
+                counts = np.frombuffer(hit[1], dtype=np.uint32)
+                if isinstance(source, Segment) and source.deleted_count:
+                    keep = ~source.deleted[docs]
+                    docs, counts = docs[keep], counts[keep]
+                if len(docs):
+                    per_term.setdefault(term, []).append((s, docs, counts))
+        scores = [None] * len(sources)
+        for term in query_terms:
+            hits = per_term.get(term)
+            if not hits:
+                continue
+            idf = math.log(doc_count / sum(len(docs) for _, docs, _ in hits))
+            for s, docs, counts in hits:
+                if scores[s] is None:
+                    scores[s] = np.full(len(sources[s].doc_lengths), -1.0)
+                lengths = np.frombuffer(sources[s].doc_lengths, dtype=np.uint32)
+                score = scores[s]
+                score[docs] = np.maximum(score[docs], 0.0) + counts / lengths[docs] * idf
+        return scores
+
+    def compute_tfidf(self, query, k=None):
+        """TF-IDF over every segment and the buffer; same shape as TFIDF.compute_tfidf."""
+        segments, buffers, _ = self._acquire()
+        try:
+            sources = segments + buffers
+            scores = self._score(sources, query)
+            candidates = []
+            for s, score in enumerate(scores):
+                if score is None:
+                    continue
+                hits = np.flatnonzero(score >= 0)
+                if k is not None and len(hits) > k:
+                    hits = hits[np.argpartition(-score[hits], k - 1)[:k]]
+                candidates.extend((float(score[i]), s, int(i)) for i in hits)
+            candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+            if k is not None:
+                candidates = candidates[:k]
+            results = []
+            for score, s, ordinal in candidates:
+                doc_id, metadata = sources[s].doc(ordinal)
+                results.append((doc_id, {'score': score, 'metadata': metadata}))
+            return results
+        finally:
+            self._release(segments)
+
+    def top_k(self, query, k=20):
+        return self.compute_tfidf(query, k)
+
+    def search_prefix(self, prefix):
+        results = {}
+        segments, _, tries = self._acquire()
+        try:
+            for source in segments + tries:
+                results.update(source.search_prefix(prefix))
+        finally:
+            self._release(segments)
+        return list(results.items())
+
+    def top_k_prefix(self, prefix, k=10):
+        """Merge the ranked streams of every segment and the buffer.
+
+        A word found in an older source is skipped if a newer source also holds
+        it, since the newer copy (with its own score) replaces it.
+        """
+        segments, _, tries = self._acquire()
+        sources = segments + tries
+
+        def ranked(position, source):
+            newer = sources[position + 1:]
+            for word, score, metadata in source.iter_ranked(prefix):
+                if not any(other.has_word(word) for other in newer):
+                    yield -score, position, word, metadata
+
+        try:
+            streams = [ranked(position, source) for position, source in enumerate(sources)]
+            return [(word, -neg_score, metadata)
+                    for neg_score, _, word, metadata in islice(heapq.merge(*streams), max(k, 0))]
+        finally:
+            self._release(segments)
+
+    def close(self):
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+        with self._lock:
+            for segment in self.segments + self._retired:
+                segment.close()
+            self.segments = []
+            self._retired = []
+
+# Example usage
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = SegmentedIndex(directory)
+        index.add_document(1, "budget report 2025 budget", {"type": "pdf", "path": "/docs/budget.pdf"})
+        index.insert("Safari", {"type": "app", "path": "/Applications/Safari.app"}, score=9.0)
+        index.flush()
+        index.add_document(2, "project plan budget", {"type": "docx", "path": "/docs/plan.docx"})
+        index.insert("Sales", {"type": "folder", "path": "/Documents/Sales"}, score=5.0)
+        index.flush()
+        index.start_merge().join()
+        index.close()
+
+        # Cold start: reopening only maps the files, nothing is re-indexed
+        index = SegmentedIndex(directory)
+        print(f"Segments: {[os.path.basename(s.path) for s in index.segments]}")
+        for doc_id, data in index.compute_tfidf("budget 2025"):
+            print(f"Document {doc_id}: Score={data['score']:.4f}, Metadata={data['metadata']}")
+        for word, score, metadata in index.top_k_prefix("sa", 2):
+            print(f"Top: {word}, Score: {score}, Metadata: {metadata}")
+        index.close()
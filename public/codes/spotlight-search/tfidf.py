@@ -1,48 +1,451 @@
 import math
+import os
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+import numpy as np
+
+class PostingList:
+    """Postings for one term as parallel uint32 columns, sorted by doc ordinal."""
+    __slots__ = ("docs", "counts")
+
+    def __init__(self):
+        self.docs = array('I')  # Doc ordinals (index into the doc store)
+        self.counts = array('I')  # Term count in that document
+
+    def __len__(self):
+        return len(self.docs)
+
+def index_batch(batch):
+    """Tokenize a batch of (doc_id, content, metadata) into flat posting columns.
+
+    Runs in a worker process. Local ordinals follow batch order; if a doc_id
+    repeats inside the batch only its last version is kept, matching what
+    successive add_document calls would leave behind. Returns
+    (docs, lengths, terms, term_ids, counts, distinct): one posting row per
+    (document, term) grouped by document, term_ids indexing into terms, and
+    distinct[i] = number of rows of document i. A few flat arrays pickle far
+    faster than per-term structures.
+    """
+    last = {doc_id: i for i, (doc_id, _, _) in enumerate(batch)}
+    docs = []
+    lengths = []
+    tokens = []
+    for i, (doc_id, content, metadata) in enumerate(batch):
+        if last[doc_id] != i:
+            continue
+        terms = content.lower().split()
+        docs.append((doc_id, metadata or {}))
+        lengths.append(len(terms))
+        tokens.extend(terms)
+    vocab = dict.fromkeys(tokens)
+    for term_id, term in enumerate(vocab):
+        vocab[term] = term_id
+    token_ids = np.fromiter(map(vocab.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    lengths = np.array(lengths, dtype=np.uint32)
+    owners = np.repeat(np.arange(len(docs), dtype=np.int64), lengths)
+    # One sort turns (document, term) keys into per-document term counts
+    keys, counts = np.unique(owners * max(len(vocab), 1) + token_ids, return_counts=True)
+    doc_rows = keys // max(len(vocab), 1)
+    distinct = np.bincount(doc_rows, minlength=len(docs)).astype(np.uint32)
+    return (docs, lengths, list(vocab), (keys - doc_rows * len(vocab)).astype(np.uint32),
+            counts.astype(np.uint32), distinct)
 
 class TFIDF:
+    # remove_document renumbers once at least half of this many ordinals are dead
+    COMPACT_MIN_DOCS = 1024
+
     def __init__(self):
-        self.index = {}  # Inverted index: term -> [(doc_id, term_count, metadata)]
-        self.doc_lengths = {}  # Total terms per document
+        self.index = {}  # Inverted index: term -> PostingList
+        self.docs = []  # Doc store: ordinal -> (doc_id, metadata), metadata held once per document
+        self.doc_lengths = array('I')  # Total terms per document, by ordinal
         self.doc_count = 0  # Total number of documents
+        self.doc_ordinal = {}  # doc_id -> insertion ordinal (postings are kept in this order)
+        self.max_tf = {}  # term -> highest term_count / doc_length over its postings
+        self.alive = bytearray()  # Tombstones: 0 for removed ordinals, whose postings are dropped lazily
+        self.doc_terms = []  # Distinct terms per ordinal, needed to update df on removal
+        self.doc_freq = {}  # term -> number of live documents containing it
+        self.dead = {}  # term -> tombstoned postings still in its list
+        self._log_df = {}  # term -> cached log(df), invalidated when df changes
+        self.generation = 0  # Bumped on every change so callers can invalidate cached results
 
     def add_document(self, doc_id, content, metadata=None):
-        """Index a document and compute term frequencies."""
+        """Index a document and compute term frequencies; an existing doc_id is replaced."""
+        if doc_id in self.doc_ordinal:
+            self.remove_document(doc_id)
+        self.generation += 1
         self.doc_count += 1
         terms = content.lower().split()
-        self.doc_lengths[doc_id] = len(terms)
+        ordinal = len(self.docs)
+        self.docs.append((doc_id, metadata or {}))
+        self.doc_lengths.append(len(terms))
+        self.doc_ordinal[doc_id] = ordinal
+        self.alive.append(1)
         term_counts = {}
-        
+
         # Count term frequencies
         for term in terms:
             term_counts[term] = term_counts.get(term, 0) + 1
-        
+
         # Update inverted index
         for term, count in term_counts.items():
-            if term not in self.index:
-                self.index[term] = []
-            self.index[term].append((doc_id, count, metadata or {}))
+            postings = self.index.get(term)
+            if postings is None:
+                postings = self.index[term] = PostingList()
+            postings.docs.append(ordinal)
+            postings.counts.append(count)
+            tf = count / len(terms)
+            if tf > self.max_tf.get(term, 0):
+                self.max_tf[term] = tf
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+            self._log_df.pop(term, None)
+        self.doc_terms.append(tuple(term_counts))
+
+    def add_partial(self, partial):
+        """Append one partial index from index_batch."""
+        self.add_partials([partial])
+
+    def add_partials(self, partials):
+        """Append partial indexes from index_batch in order, offsetting their local ordinals.
+
+        The postings of all the partials are concatenated and stably sorted by
+        term once, so each term's list is extended a single time however many
+        partials mention it. A doc_id repeated across partials keeps its last version.
+        """
+        self.generation += 1
+        last = {}  # doc_id -> (partial, local ordinal) of its last version
+        total = 0
+        for p, partial in enumerate(partials):
+            for i, (doc_id, _) in enumerate(partial[0]):
+                last[doc_id] = (p, i)
+            total += len(partial[0])
+        for doc_id in last:
+            if doc_id in self.doc_ordinal:
+                self.remove_document(doc_id)
+
+        vocab = dict.fromkeys(chain.from_iterable(partial[2] for partial in partials))
+        for term_id, term in enumerate(vocab):
+            vocab[term] = term_id  # term -> id within this merge
+        term_columns, ordinal_columns, count_columns, tf_columns = [], [], [], []
+        for p, (docs, lengths, terms, term_ids, counts, distinct) in enumerate(partials):
+            rows = np.repeat(np.arange(len(docs)), distinct)  # Local document of each posting
+            if len(last) == total:
+                keep = np.ones(len(docs), dtype=bool)
+            else:
+                keep = np.fromiter((last[doc_id] == (p, i) for i, (doc_id, _) in enumerate(docs)),
+                                   dtype=bool, count=len(docs))
+                docs = [doc for doc, kept in zip(docs, keep) if kept]
+            ordinals = len(self.docs) + np.cumsum(keep) - 1
+            names = np.array(terms, dtype=object)[term_ids].tolist()
+            bounds = np.r_[0, np.cumsum(distinct)].tolist()
+            self.doc_terms.extend(tuple(names[bounds[i]:bounds[i + 1]]) for i in np.flatnonzero(keep).tolist())
+            for ordinal, (doc_id, _) in enumerate(docs, len(self.docs)):
+                self.doc_ordinal[doc_id] = ordinal
+            self.docs.extend(docs)
+            self.doc_lengths.frombytes(lengths[keep].tobytes())
+            self.alive.extend(b"\x01" * len(docs))
+            self.doc_count += len(docs)
+
+            live = keep[rows]
+            rows = rows[live]
+            term_map = np.fromiter(map(vocab.__getitem__, terms), dtype=np.int64, count=len(terms))
+            term_columns.append(term_map[term_ids[live]])
+            ordinal_columns.append(ordinals[rows])
+            count_columns.append(counts[live])
+            tf_columns.append(counts[live] / lengths[rows])
+        if not vocab:
+            return
+
+        # Ordinals grow along the concatenation, so a stable sort by term keeps each list sorted
+        term_ids = np.concatenate(term_columns)
+        if len(vocab) <= np.iinfo(np.uint16).max:
+            term_ids = term_ids.astype(np.uint16)  # NumPy's stable sort is a radix sort for 16-bit keys
+        order = np.argsort(term_ids, kind='stable')
+        term_ids = term_ids[order]
+        starts = np.flatnonzero(np.r_[True, term_ids[1:] != term_ids[:-1]])
+        ends = np.r_[starts[1:], len(term_ids)]
+        ordinals = np.concatenate(ordinal_columns)[order].astype(np.uint32).tobytes()
+        counts = np.concatenate(count_columns)[order].astype(np.uint32).tobytes()
+        max_tfs = np.maximum.reduceat(np.concatenate(tf_columns)[order], starts).tolist()
+        names = list(vocab)
+        for term_id, start, end, max_tf in zip(term_ids[starts].tolist(), starts.tolist(), ends.tolist(), max_tfs):
+            term = names[term_id]
+            plist = self.index.get(term)
+            if plist is None:
+                plist = self.index[term] = PostingList()
+            plist.docs.frombytes(ordinals[4 * start:4 * end])
+            plist.counts.frombytes(counts[4 * start:4 * end])
+            if max_tf > self.max_tf.get(term, 0):
+                self.max_tf[term] = max_tf
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + end - start
+            self._log_df.pop(term, None)
+
+    # bulk_add merges partials in groups of about this many postings
+    MERGE_POSTINGS = 1 << 21
+
+    def bulk_add(self, documents, workers=None, batch_size=1000):
+        """Index an iterable of (doc_id, content, metadata) in batches.
+
+        Documents are pulled from the iterable lazily in batches and turned into
+        flat posting columns by index_batch, in worker processes when workers > 1
+        (in this process otherwise, which skips the pickling). Partials are
+        merged in input order, a group of about MERGE_POSTINGS postings at a
+        time, so postings stay sorted by ordinal. At most two batches per worker
+        are in flight, which bounds memory for arbitrarily long streams.
+        """
+        documents = iter(documents)
+        workers = workers or os.cpu_count() or 1
+        group = []
+        group_postings = 0
+
+        def collect(partial):
+            nonlocal group_postings
+            group.append(partial)
+            group_postings += len(partial[3])
+            if group_postings >= self.MERGE_POSTINGS:
+                self.add_partials(group)
+                group.clear()
+                group_postings = 0
+
+        if workers == 1:
+            while True:
+                batch = list(islice(documents, batch_size))
+                if not batch:
+                    break
+                collect(index_batch(batch))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                in_flight = deque()
+                limit = 2 * workers
+                while True:
+                    while len(in_flight) < limit:
+                        batch = list(islice(documents, batch_size))
+                        if not batch:
+                            break
+                        in_flight.append(pool.submit(index_batch, batch))
+                    if not in_flight:
+                        break
+                    collect(in_flight.popleft().result())
+        if group:
+            self.add_partials(group)
+
+    def update_document(self, doc_id, content, metadata=None):
+        """Re-index a changed document under the same doc_id."""
+        self.add_document(doc_id, content, metadata)
+
+    def remove_document(self, doc_id):
+        """Tombstone a document; returns False if doc_id is not indexed.
+
+        Only per-term counters are touched here. The postings themselves are
+        dropped lazily, once a term's list is at least half tombstones, and the
+        doc columns are renumbered by compact() once half the ordinals are dead.
+        """
+        ordinal = self.doc_ordinal.pop(doc_id, None)
+        if ordinal is None:
+            return False
+        self.generation += 1
+        self.doc_count -= 1
+        self.alive[ordinal] = 0
+        self.docs[ordinal] = None
+        for term in self.doc_terms[ordinal]:
+            self._log_df.pop(term, None)
+            self.doc_freq[term] -= 1
+            if self.doc_freq[term] == 0:
+                # Last live document with this term: drop the whole list
+                del self.index[term], self.max_tf[term], self.doc_freq[term]
+                self.dead.pop(term, None)
+            else:
+                self.dead[term] = self.dead.get(term, 0) + 1
+        self.doc_terms[ordinal] = None
+        if len(self.docs) >= self.COMPACT_MIN_DOCS and self.doc_count * 2 <= len(self.docs):
+            self.compact()
+        return True
+
+    def _idf(self, term, log_n):
+        """IDF = log(N / df(t)) = log N - log df(t); log df(t) is cached per term."""
+        log_df = self._log_df.get(term)
+        if log_df is None:
+            log_df = self._log_df[term] = math.log(self.doc_freq[term])
+        return log_n - log_df
+
+    def _postings(self, term):
+        """Return the term's PostingList, compacting it first if it is mostly tombstones."""
+        postings = self.index[term]
+        dead = self.dead.get(term, 0)
+        if dead and dead * 2 >= len(postings):
+            self._compact(term)
+            postings = self.index[term]
+        return postings
+
+    def _compact(self, term):
+        old = self.index[term]
+        postings = PostingList()
+        max_tf = 0
+        for ordinal, count in zip(old.docs, old.counts):
+            if self.alive[ordinal]:
+                postings.docs.append(ordinal)
+                postings.counts.append(count)
+                max_tf = max(max_tf, count / self.doc_lengths[ordinal])
+        self.index[term] = postings
+        self.max_tf[term] = max_tf
+        self.dead[term] = 0
+
+    def compact(self):
+        """Drop every tombstone and renumber the live documents densely.
+
+        Ordinals keep their relative order, so ties still favour the earlier
+        document. The columns and postings are rebuilt as new objects rather
+        than edited in place, so a reader holding the old ones stays consistent.
+        """
+        if self.doc_count == len(self.docs):
+            return
+        self.generation += 1
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        remap = (np.cumsum(alive) - 1).astype(np.uint32)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        index = {}
+        for term, old in self.index.items():
+            docs = np.frombuffer(old.docs, dtype=np.uint32)
+            counts = np.frombuffer(old.counts, dtype=np.uint32)
+            if self.dead.get(term):
+                keep = alive[docs]
+                docs, counts = docs[keep], counts[keep]
+                self.max_tf[term] = float((counts / lengths[docs]).max())
+            postings = index[term] = PostingList()
+            postings.docs.frombytes(remap[docs].tobytes())
+            postings.counts.frombytes(counts.tobytes())
+        self.index = index
+        self.dead = {}
+        doc_lengths = array('I')
+        doc_lengths.frombytes(lengths[alive].tobytes())
+        self.doc_lengths = doc_lengths
+        self.docs = [doc for doc in self.docs if doc is not None]
+        self.doc_terms = [terms for terms in self.doc_terms if terms is not None]
+        self.alive = bytearray(b"\x01" * len(self.docs))
+        self.doc_ordinal = {doc_id: ordinal for ordinal, (doc_id, _) in enumerate(self.docs)}
 
     def compute_tfidf(self, query):
         """Compute TF-IDF scores for documents matching the query."""
         query_terms = query.lower().split()
-        scores = {}
-        
+        # Zero-copy NumPy views over the array columns; each posting list is scored in one shot
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        scores = np.zeros(len(self.docs))
+        matched = np.zeros(len(self.docs), dtype=bool)
+        log_n = math.log(self.doc_count) if self.doc_count else 0.0
+
         for term in query_terms:
             if term in self.index:
-                # IDF = log(N / df(t))
-                idf = math.log(self.doc_count / len(self.index[term]))
-                for doc_id, term_count, metadata in self.index[term]:
-                    # TF = term_count / doc_length
-                    tf = term_count / self.doc_lengths[doc_id]
-                    # TF-IDF score
-                    score = tf * idf
-                    if doc_id not in scores:
-                        scores[doc_id] = {'score': 0, 'metadata': metadata}
-                    scores[doc_id]['score'] += score
-        
-        # Sort documents by score
-        return sorted(scores.items(), key=lambda x: x[1]['score'], reverse=True)
+                postings = self._postings(term)
+                idf = self._idf(term, log_n)
+                docs = np.frombuffer(postings.docs, dtype=np.uint32)
+                counts = np.frombuffer(postings.counts, dtype=np.uint32)
+                # TF = term_count / doc_length; ordinals are unique within a list, so += is safe
+                scores[docs] += counts / lengths[docs] * idf
+                matched[docs] = True
+
+        # Sort documents by score, skipping tombstones not yet cleaned out of the postings
+        matched &= np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        hits = np.flatnonzero(matched)
+        order = hits[np.argsort(-scores[hits], kind='stable')]
+        results = []
+        for ordinal in order.tolist():
+            doc_id, metadata = self.docs[ordinal]
+            results.append((doc_id, {'score': float(scores[ordinal]), 'metadata': metadata}))
+        return results
+
+    def top_k(self, query, k=20):
+        """Return the k best documents for query, same shape as compute_tfidf.
+
+        MaxScore: each term has an upper bound idf * max_tf. Terms are sorted by
+        bound and the cheapest ones whose bounds together cannot beat the current
+        k-th score become non-essential: documents are only enumerated from the
+        essential posting lists, and non-essential lists are probed by binary
+        search only while the document can still enter the heap. Ties are broken
+        in favour of the earlier-indexed document.
+        """
+        if k <= 0:
+            return []
+        weights = {}
+        for term in query.lower().split():
+            if term in self.index:
+                weights[term] = weights.get(term, 0) + 1
+        if not weights:
+            return []
+
+        lengths = self.doc_lengths
+        alive = self.alive
+        log_n = math.log(self.doc_count)
+        terms = []  # (upper_bound, docs, counts, weighted idf)
+        for term, weight in weights.items():
+            postings = self._postings(term)
+            idf = weight * self._idf(term, log_n)
+            terms.append((idf * self.max_tf[term], postings.docs, postings.counts, idf))
+        terms.sort(key=lambda t: t[0])
+        n = len(terms)
+        prefix_bound = []  # prefix_bound[i] = sum of bounds of terms[0..i]
+        total = 0.0
+        for bound, _, _, _ in terms:
+            total += bound
+            prefix_bound.append(total)
+
+        cursors = [0] * n
+        heap = []  # (score, -ordinal); root is the current k-th best
+        threshold = float("-inf")
+        first_essential = 0
+
+        while True:
+            # Next candidate: smallest ordinal under any essential cursor
+            current = None
+            for i in range(first_essential, n):
+                docs = terms[i][1]
+                if cursors[i] < len(docs):
+                    doc_ord = docs[cursors[i]]
+                    if current is None or doc_ord < current:
+                        current = doc_ord
+            if current is None:
+                break
+
+            score = 0.0
+            for i in range(first_essential, n):
+                _, docs, counts, idf = terms[i]
+                pos = cursors[i]
+                if pos < len(docs) and docs[pos] == current:
+                    score += counts[pos] / lengths[current] * idf
+                    cursors[i] = pos + 1
+
+            # Probe non-essential lists from the largest bound down, bailing out early
+            for i in range(first_essential - 1, -1, -1):
+                if score + prefix_bound[i] <= threshold:
+                    break
+                _, docs, counts, idf = terms[i]
+                pos = bisect_left(docs, current, lo=cursors[i])
+                cursors[i] = pos
+                if pos < len(docs) and docs[pos] == current:
+                    score += counts[pos] / lengths[current] * idf
+            else:
+                if not alive[current]:
+                    continue
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -current))
+                elif score > threshold:
+                    heapq.heapreplace(heap, (score, -current))
+                else:
+                    continue
+                if len(heap) == k:
+                    threshold = heap[0][0]
+                    while first_essential < n and prefix_bound[first_essential] <= threshold:
+                        first_essential += 1
+                    if first_essential == n:
+                        break  # No unseen document can beat the heap anymore
+
+        results = []
+        for score, neg_ordinal in sorted(heap, key=lambda e: (-e[0], -e[1])):
+            doc_id, metadata = self.docs[-neg_ordinal]
+            results.append((doc_id, {'score': score, 'metadata': metadata}))
+        return results
 
 # Example usage
 if __name__ == "__main__":
@@ -51,8 +454,23 @@ if __name__ == "__main__":
     tfidf.add_document(1, "budget report 2025 budget", {"type": "pdf", "path": "/docs/budget.pdf"})
     tfidf.add_document(2, "project plan budget", {"type": "docx", "path": "/docs/plan.docx"})
     tfidf.add_document(3, "meeting notes", {"type": "txt", "path": "/docs/notes.txt"})
-    
+
     # Search query
     results = tfidf.compute_tfidf("budget 2025")
     for doc_id, data in results:
-        print(f"Document {doc_id}: Score={data['score']:.4f}, Metadata={data['metadata']}")
\ No newline at end of file
+        print(f"Document {doc_id}: Score={data['score']:.4f}, Metadata={data['metadata']}")
+
+    # Only the best document, skipping postings that cannot make the cut
+    for doc_id, data in tfidf.top_k("budget 2025", k=1):
+        print(f"Top document {doc_id}: Score={data['score']:.4f}")
+
+    # Re-index a changed file and drop a deleted one without rebuilding
+    tfidf.update_document(2, "project plan 2025", {"type": "docx", "path": "/docs/plan.docx"})
+    tfidf.remove_document(3)
+    for doc_id, data in tfidf.compute_tfidf("budget 2025"):
+        print(f"After update {doc_id}: Score={data['score']:.4f}")
+
+    # Bulk build from a stream of documents, tokenized in worker processes
+    bulk = TFIDF()
+    bulk.bulk_add(((i, f"report {i % 7} budget", {"id": i}) for i in range(10000)), batch_size=2500)
+    print(f"Bulk indexed {bulk.doc_count} documents, top: {bulk.top_k('report 3', k=1)[0][0]}")
@@ -1,50 +1,144 @@
+import heapq
+from itertools import islice
+
 class TrieNode:
-    def __init__(self):
-        self.children = {}  # Dictionary for child nodes (character -> TrieNode)
+    # __slots__ keeps per-node overhead small for million-entry catalogs
+    __slots__ = ("label", "children", "is_end", "metadata", "score", "best")
+
+    def __init__(self, label=""):
+        self.label = label  # Edge label from parent (path-compressed, may span many chars)
+        self.children = {}  # Dictionary for child nodes (first char of label -> TrieNode)
         self.is_end = False  # Marks end of a word
         self.metadata = None  # Stores metadata (e.g., file path, type)
+        self.score = 0.0  # Ranking score of the word ending here
+        self.best = float("-inf")  # Upper bound on any score in this subtree
 
 class Trie:
     def __init__(self):
         self.root = TrieNode()
+        self.generation = 0  # Bumped on every insert so callers can invalidate cached results
 
-    def insert(self, word, metadata=None):
-        """Insert a word into the trie with optional metadata."""
+    def insert(self, word, metadata=None, score=0.0):
+        """Insert a word into the radix trie with optional metadata and ranking score."""
+        self.generation += 1
+        word = word.lower()
         node = self.root
-        for char in word.lower():
-            if char not in node.children:
-                node.children[char] = TrieNode()
-            node = node.children[char]
+        node.best = max(node.best, score)
+        i = 0
+        while i < len(word):
+            child = node.children.get(word[i])
+            if child is None:
+                # No edge shares a first char: hang the whole remainder off this node
+                child = TrieNode(word[i:])
+                node.children[word[i]] = child
+                node = child
+                i = len(word)
+                break
+            label = child.label
+            # Length of the common prefix between the edge label and the rest of the word
+            j = 0
+            while j < len(label) and i + j < len(word) and label[j] == word[i + j]:
+                j += 1
+            if j < len(label):
+                # Split the edge: node -> mid(label[:j]) -> child(label[j:])
+                mid = TrieNode(label[:j])
+                mid.best = child.best
+                child.label = label[j:]
+                mid.children[child.label[0]] = child
+                node.children[word[i]] = mid
+                child = mid
+            node = child
+            node.best = max(node.best, score)
+            i += j
         node.is_end = True
         node.metadata = metadata or {}
+        node.score = score
+        # Stale (higher) `best` values left by a re-insert stay valid upper bounds
+        node.best = max(node.best, score)
+
+    def _find(self, prefix):
+        """Locate the node covering prefix; returns (node, remainder of its label) or (None, None)."""
+        node = self.root
+        i = 0
+        while i < len(prefix):
+            child = node.children.get(prefix[i])
+            if child is None:
+                return None, None
+            label = child.label
+            rest = prefix[i:i + len(label)]
+            if not label.startswith(rest):
+                return None, None
+            node = child
+            i += len(rest)
+            if len(rest) < len(label):
+                # Prefix ends in the middle of this edge
+                return node, label[len(rest):]
+        return node, ""
 
     def search_prefix(self, prefix):
         """Find all words with the given prefix and return their metadata."""
-        node = self.root
-        for char in prefix.lower():
-            if char not in node.children:
-                return []
-            node = node.children[char]
-        return self._collect_words(node, prefix)
+        node, tail = self._find(prefix.lower())
+        if node is None:
+            return []
+        return self._collect_words(node, prefix + tail)
 
     def _collect_words(self, node, prefix):
-        """Helper to collect all words under a node."""
+        """Helper to collect all words under a node (iterative, no per-char string copies)."""
         results = []
-        if node.is_end:
-            results.append((prefix, node.metadata))
-        for char, child in node.children.items():
-            results.extend(self._collect_words(child, prefix + char))
+        stack = [(node, prefix)]
+        while stack:
+            node, word = stack.pop()
+            if node.is_end:
+                results.append((word, node.metadata))
+            for child in reversed(list(node.children.values())):
+                stack.append((child, word + child.label))
         return results
 
+    def has_word(self, word):
+        node, tail = self._find(word.lower())
+        return node is not None and tail == "" and node.is_end
+
+    def iter_ranked(self, prefix):
+        """Yield (word, score, metadata) completions of prefix, best score first.
+
+        Best-first search over the per-node `best` summaries: a subtree is only
+        opened once its upper bound beats everything still waiting in the heap,
+        so taking k results visits O(k * depth) nodes instead of the whole subtree.
+        """
+        node, tail = self._find(prefix.lower())
+        if node is None:
+            return
+        counter = 0  # Tie-breaker so the heap never compares nodes
+        heap = [(-node.best, counter, False, node, prefix + tail)]
+        while heap:
+            neg_score, _, is_word, node, word = heapq.heappop(heap)
+            if is_word:
+                yield word, -neg_score, node.metadata
+                continue
+            if node.is_end:
+                counter += 1
+                heapq.heappush(heap, (-node.score, counter, True, node, word))
+            for child in node.children.values():
+                counter += 1
+                heapq.heappush(heap, (-child.best, counter, False, child, word + child.label))
+
+    def top_k(self, prefix, k=10):
+        """Return the k highest-scoring (word, score, metadata) completions of prefix."""
+        return list(islice(self.iter_ranked(prefix), max(k, 0)))
+
 # Example usage
 if __name__ == "__main__":
     trie = Trie()
-    # Sample data: app/file names with metadata
-    trie.insert("Safari", {"type": "app", "path": "/Applications/Safari.app"})
-    trie.insert("Sample.pdf", {"type": "pdf", "path": "/Documents/Sample.pdf"})
-    trie.insert("Sales", {"type": "folder", "path": "/Documents/Sales"})
-    
+    # Sample data: app/file names with metadata and usage scores
+    trie.insert("Safari", {"type": "app", "path": "/Applications/Safari.app"}, score=9.0)
+    trie.insert("Sample.pdf", {"type": "pdf", "path": "/Documents/Sample.pdf"}, score=2.0)
+    trie.insert("Sales", {"type": "folder", "path": "/Documents/Sales"}, score=5.0)
+
     # Search for prefix "Sa"
     results = trie.search_prefix("Sa")
     for word, metadata in results:
-        print(f"Found: {word}, Metadata: {metadata}")
\ No newline at end of file
+        print(f"Found: {word}, Metadata: {metadata}")
+
+    # Top 2 completions for "Sa" without walking the whole subtree
+    for word, score, metadata in trie.top_k("Sa", 2):
+        print(f"Top: {word}, Score: {score}, Metadata: {metadata}")
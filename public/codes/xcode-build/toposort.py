@@ -1,4 +1,11 @@
 from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import heapq
+import json
+import os
+import time
+import numpy as np
 
 # Kahn's Algorithm for Topological Sort
 def topological_sort_kahn(graph):
@@ -47,28 +54,493 @@ def topological_sort_dfs(graph):
     recursion_stack = set()
     result = []
     
-    def dfs(node):
-        visited.add(node)
-        recursion_stack.add(node)
-        
-        for dependent in graph[node]:
-            if dependent not in visited:
-                if not dfs(dependent):
-                    return False  # Cycle detected
-            elif dependent in recursion_stack:
-                return False  # Cycle detected
-        
-        recursion_stack.remove(node)
-        result.append(node)
-        return True
-    
-    for node in graph:
-        if node not in visited:
-            if not dfs(node):
-                return None  # Cycle detected
+    # Iterative DFS: an explicit stack of (node, dependent iterator) replaces
+    # recursion so deep dependency chains cannot hit the recursion limit
+    for root in graph:
+        if root in visited:
+            continue
+        visited.add(root)
+        recursion_stack.add(root)
+        stack = [(root, iter(graph[root]))]
+        while stack:
+            node, dependents = stack[-1]
+            for dependent in dependents:
+                if dependent not in visited:
+                    visited.add(dependent)
+                    recursion_stack.add(dependent)
+                    stack.append((dependent, iter(graph[dependent])))
+                    break
+                elif dependent in recursion_stack:
+                    return None  # Cycle detected
+            else:
+                stack.pop()
+                recursion_stack.remove(node)
+                result.append(node)
     
     return result[::-1]  # Reverse to get correct order
 
+# Integer-Indexed Graph Core
+class CSRGraph:
+    """
+    Dependency graph with node names interned to integer ids and edges in
+    compressed sparse row form: the dependents of node i are
+    indices[indptr[i]:indptr[i + 1]]. Two int arrays replace a dict of
+    lists, and every algorithm below is iterative.
+    """
+    def __init__(self, names, indptr, indices):
+        self.names = names  # id -> node name
+        self.indptr = indptr
+        self.indices = indices
+        self._ids = None
+
+    @property
+    def ids(self):
+        """Node name -> id, built on first use (the sorts never need it)."""
+        if self._ids is None:
+            self._ids = {name: i for i, name in enumerate(self.names)}
+        return self._ids
+
+    @classmethod
+    def from_adjacency(cls, graph):
+        """Build from the dict form used above (graph[node] = list of dependents)."""
+        names = list(graph)
+        ids = {name: i for i, name in enumerate(names)}
+        for dependents in graph.values():
+            for dependent in dependents:
+                if dependent not in ids:
+                    ids[dependent] = len(names)
+                    names.append(dependent)
+        counts = [len(graph.get(name, ())) for name in names]
+        indptr = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.fromiter((ids[d] for name in names for d in graph.get(name, ())),
+                              dtype=np.int32, count=int(indptr[-1]))
+        graph_core = cls(names, indptr, indices)
+        graph_core._ids = ids
+        return graph_core
+
+    @classmethod
+    def from_edges(cls, names, sources, targets):
+        """Build from parallel id arrays of (dependency -> dependent) edges."""
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(names))
+        indptr = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(list(names), indptr, np.asarray(targets, dtype=np.int32)[order])
+
+    def __len__(self):
+        return len(self.names)
+
+    NARROW_LEVEL = 64
+
+    def _out_edges(self, nodes):
+        """Positions in `indices` of every out-edge of `nodes`, plus each node's edge count."""
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        total = int(counts.sum())
+        return np.arange(total) + np.repeat(starts - (np.cumsum(counts) - counts), counts), counts
+
+    def _kahn_order(self):
+        """
+        Kahn's algorithm one level at a time; returns the ids it could order
+        (all of them unless there is a cycle). A level is the current zero
+        in-degree frontier: NumPy gathers its out-edges and subtracts their
+        in-degree counts in one pass, and the dependents that reach zero form
+        the next level (in id order). Each level costs a fixed overhead, so
+        once levels stay narrow (a deep, chain-like graph) the rest runs on a
+        scalar queue.
+        """
+        n = len(self.names)
+        in_degree = np.bincount(self.indices, minlength=n)
+        frontier = np.flatnonzero(in_degree == 0)
+        levels = []
+        narrow = 0  # Consecutive levels below NARROW_LEVEL nodes
+        while frontier.size:
+            levels.append(frontier)
+            narrow = narrow + 1 if frontier.size < self.NARROW_LEVEL else 0
+            if narrow > self.NARROW_LEVEL:
+                levels[-1] = np.array(self._kahn_queue(in_degree, frontier), dtype=np.int64)
+                break
+            positions, _ = self._out_edges(frontier)
+            if not positions.size:
+                break
+            dependents, drops = np.unique(self.indices[positions], return_counts=True)
+            in_degree[dependents] -= drops
+            frontier = dependents[in_degree[dependents] == 0]
+        return np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+
+    def _kahn_queue(self, in_degree, frontier):
+        """Plain FIFO Kahn from `frontier`; returns the frontier plus everything it releases."""
+        in_degree = in_degree.tolist()
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        order = frontier.tolist()
+        # `order` doubles as the FIFO queue: everything past `head` is still pending
+        head = 0
+        while head < len(order):
+            node = order[head]
+            head += 1
+            for dependent in indices[indptr[node]:indptr[node + 1]]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    order.append(dependent)
+        return order
+
+    def _subgraph(self, nodes, reverse=False):
+        """Graph induced by the ids in `nodes` (edges flipped if reverse); its names are those ids."""
+        local = np.full(len(self.names), -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        positions, counts = self._out_edges(nodes)
+        sources = np.repeat(np.arange(len(nodes)), counts)
+        targets = local[self.indices[positions]]
+        inside = targets >= 0
+        sources, targets = sources[inside], targets[inside]
+        if reverse:
+            sources, targets = targets, sources
+        return CSRGraph.from_edges(nodes.tolist(), sources, targets)
+
+    def topological_sort_kahn(self, as_names=True):
+        """Kahn's algorithm on ids; returns the order, or None if a cycle is detected."""
+        order = self._kahn_order()
+        if len(order) != len(self.names):
+            return None
+        order = order.tolist()
+        return [self.names[i] for i in order] if as_names else order
+
+    def topological_sort_dfs(self, as_names=True):
+        """Iterative DFS sort; returns the order, or None if a cycle is detected."""
+        n = len(self.names)
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        state = bytearray(n)  # 0 = unvisited, 1 = on the DFS stack, 2 = finished
+        position = indptr[:-1]  # Next edge to try, per node
+        result = []
+        for root in range(n):
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [root]
+            while stack:
+                node = stack[-1]
+                if position[node] < indptr[node + 1]:
+                    dependent = indices[position[node]]
+                    position[node] += 1
+                    if state[dependent] == 0:
+                        state[dependent] = 1
+                        stack.append(dependent)
+                    elif state[dependent] == 1:
+                        return None  # Back edge: cycle detected
+                else:
+                    state[node] = 2
+                    result.append(stack.pop())
+        result.reverse()
+        return [self.names[i] for i in result] if as_names else result
+
+    def strongly_connected_components(self):
+        """
+        SCCs as lists of ids, dependents before dependencies. Nodes that Kahn
+        peels from either end lie on no cycle and are single-node components,
+        so Tarjan only runs on the cyclic core left over (empty for a DAG).
+        """
+        n = len(self.names)
+        sources = self._kahn_order()  # No cycle reaches these
+        if len(sources) == n:
+            return [[i] for i in reversed(sources.tolist())]
+        rest = np.ones(n, dtype=bool)
+        rest[sources] = False
+        remaining = np.flatnonzero(rest)
+        sinks = remaining[self._subgraph(remaining, reverse=True)._kahn_order()]  # These reach no cycle
+        rest[sinks] = False
+        core = self._subgraph(np.flatnonzero(rest))
+        components = [[i] for i in sinks.tolist()]
+        components += [[core.names[i] for i in component] for component in core._tarjan()]
+        components += [[i] for i in reversed(sources.tolist())]
+        return components
+
+    def _tarjan(self):
+        """Iterative Tarjan; returns SCCs as lists of ids (dependents before dependencies)."""
+        n = len(self.names)
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        index = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        position = indptr[:-1]
+        scc_stack = []
+        components = []
+        counter = 0
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            scc_stack.append(root)
+            on_stack[root] = 1
+            call_stack = [root]
+            while call_stack:
+                node = call_stack[-1]
+                if position[node] < indptr[node + 1]:
+                    dependent = indices[position[node]]
+                    position[node] += 1
+                    if index[dependent] < 0:
+                        index[dependent] = low[dependent] = counter
+                        counter += 1
+                        scc_stack.append(dependent)
+                        on_stack[dependent] = 1
+                        call_stack.append(dependent)
+                    elif on_stack[dependent] and index[dependent] < low[node]:
+                        low[node] = index[dependent]
+                    continue
+                call_stack.pop()
+                if call_stack and low[node] < low[call_stack[-1]]:
+                    low[call_stack[-1]] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def cycles(self):
+        """
+        Report dependency cycles by name: one concrete cycle per cyclic SCC,
+        e.g. ['A', 'B', 'C', 'A'], plus the full SCC membership.
+        Returns:
+            list: [(cycle path, sorted SCC member names)], empty if acyclic.
+        """
+        report = []
+        owners = np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+        self_loops = set(owners[self.indices == owners].tolist())
+        for component in self.strongly_connected_components():
+            start = component[0]
+            if len(component) == 1 and start not in self_loops:
+                continue
+            members = set(component)
+            # Every member has a successor inside the SCC, so walking one must loop
+            seen = {}
+            path = []
+            node = start
+            while node not in seen:
+                seen[node] = len(path)
+                path.append(node)
+                node = next(int(d) for d in self.indices[self.indptr[node]:self.indptr[node + 1]]
+                            if int(d) in members)
+            loop = path[seen[node]:] + [node]
+            report.append(([self.names[i] for i in loop], sorted((self.names[i] for i in component), key=str)))
+        return report
+
+# Critical-Path Priorities
+def critical_path_lengths(graph, durations=None):
+    """
+    Compute, for every node, the longest remaining chain of work it starts.
+    Args:
+        graph (dict): Adjacency list where graph[node] = list of dependents.
+        durations (dict): Optional estimated cost per node (default 1 each).
+    Returns:
+        dict: node -> its own cost plus the most expensive dependent chain,
+        or None if a cycle is detected.
+    """
+    order = topological_sort_kahn(graph)
+    if order is None:
+        return None
+    durations = durations or {}
+    lengths = {}
+    # Walk in reverse so every dependent is finished before its dependency
+    for node in reversed(order):
+        tail = max((lengths[dependent] for dependent in graph[node]), default=0)
+        lengths[node] = durations.get(node, 1) + tail
+    return lengths
+
+def _timed_call(build_fn, node):
+    start = time.monotonic()
+    result = build_fn(node)
+    return result, start, time.monotonic()
+
+# Parallel Build Executor
+def parallel_build(graph, build_fn, workers=4, durations=None, use_processes=False):
+    """
+    Build every node, running independent nodes concurrently.
+    A node is submitted as soon as all of its dependencies have finished
+    (its in-degree reaches zero, as in Kahn's algorithm). When more nodes are
+    ready than there are free workers, the one heading the longest critical
+    path goes first.
+    Args:
+        graph (dict): Adjacency list where graph[node] = list of dependents.
+        build_fn (callable): Called as build_fn(node) on a worker; must be
+            picklable when use_processes is True.
+        workers (int): Number of pool workers.
+        durations (dict): Optional cost estimates used for the priorities.
+        use_processes (bool): Use a process pool instead of a thread pool.
+    Returns:
+        dict: {'order': completion order, 'results': node -> return value,
+        'timings': node -> (start, end) on the monotonic clock,
+        'wall_time': seconds}, or None if a cycle is detected.
+        If a task raises, no new tasks are started and the error is re-raised
+        once the running ones finish.
+    """
+    priority = critical_path_lengths(graph, durations)
+    if priority is None:
+        return None
+
+    in_degree = defaultdict(int)
+    for node in graph:
+        for dependent in graph[node]:
+            in_degree[dependent] += 1
+    ready = [(-priority[node], i, node) for i, node in enumerate(graph) if in_degree[node] == 0]
+    heapq.heapify(ready)
+    tie = len(ready)
+
+    order, results, timings = [], {}, {}
+    error = None
+    start = time.monotonic()
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as pool:
+        running = {}  # future -> node
+        while ready or running:
+            # Fill idle workers, most critical first
+            while ready and len(running) < workers and error is None:
+                _, _, node = heapq.heappop(ready)
+                running[pool.submit(_timed_call, build_fn, node)] = node
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    results[node], task_start, task_end = future.result()
+                except Exception as exc:
+                    error = error or exc
+                    continue
+                timings[node] = (task_start, task_end)
+                order.append(node)
+                for dependent in graph[node]:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        heapq.heappush(ready, (-priority[dependent], tie, dependent))
+                        tie += 1
+    if error is not None:
+        raise error
+    return {'order': order, 'results': results, 'timings': timings,
+            'wall_time': time.monotonic() - start}
+
+# Incremental Builds
+def dirty_closure(graph, changed):
+    """
+    Collect every node reachable from the changed nodes via dependent edges.
+    Args:
+        graph (dict): Adjacency list where graph[node] = list of dependents.
+        changed (iterable): Nodes whose inputs may have changed.
+    Returns:
+        set: The changed nodes plus everything that transitively depends on them.
+    """
+    closure = set()
+    queue = deque(node for node in changed if node in graph)
+    closure.update(queue)
+    while queue:
+        node = queue.popleft()
+        for dependent in graph[node]:
+            if dependent not in closure:
+                closure.add(dependent)
+                queue.append(dependent)
+    return closure
+
+def file_content_hash(path):
+    """SHA-256 of a file's bytes, streamed in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BuildCache:
+    """
+    Persisted build state: node -> {'key': input key, 'deps': dependencies}.
+    A node's input key hashes its own content hash together with the keys
+    of its dependencies, so any upstream change produces a new key.
+    Without a path the cache lives in memory only and save() does nothing.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def update(self, entries):
+        self.entries.update(entries)
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+def plan_incremental_build(graph, changed, content_hash, cache):
+    """
+    Compute the minimal build order after some inputs changed.
+    Only the dirty closure of the changed nodes is visited and sorted; the
+    rest of the graph is never touched, so a no-op plan costs nothing. Within
+    the closure, a node whose recomputed input key matches the cache is
+    skipped (early cutoff), which in turn keeps its dependents' keys stable.
+    Args:
+        graph (dict): Adjacency list where graph[node] = list of dependents.
+        changed (iterable): Nodes whose content may have changed.
+        content_hash (callable): content_hash(node) -> str for the node's own inputs.
+        cache (BuildCache): Keys from the last successful build.
+    Returns:
+        tuple: (build order, cache entries to commit once that build succeeds),
+        or (None, None) if the closure contains a cycle.
+    """
+    closure = dirty_closure(graph, changed)
+    if not closure:
+        return [], {}
+
+    # Kahn's algorithm restricted to edges inside the closure
+    in_degree = {node: 0 for node in closure}
+    closure_deps = defaultdict(list)
+    for node in closure:
+        for dependent in graph[node]:
+            in_degree[dependent] += 1
+            closure_deps[dependent].append(node)
+    queue = deque(node for node in closure if in_degree[node] == 0)
+
+    keys = {}
+    order, updates = [], {}
+    visited = 0
+    while queue:
+        node = queue.popleft()
+        visited += 1
+        entry = cache.entries.get(node, {})
+        deps = sorted(set(entry.get('deps', [])) | set(closure_deps[node]))
+        digest = hashlib.sha256(content_hash(node).encode())
+        for dep in deps:
+            dep_key = keys.get(dep) or cache.entries.get(dep, {}).get('key', '')
+            digest.update(f"\0{dep}\0{dep_key}".encode())
+        keys[node] = digest.hexdigest()
+        if entry.get('key') != keys[node]:
+            order.append(node)
+            updates[node] = {'key': keys[node], 'deps': deps}
+        for dependent in graph[node]:
+            in_degree[dependent] -= 1
+            if in_degree[dependent] == 0:
+                queue.append(dependent)
+
+    if visited != len(closure):
+        return None, None
+    return order, updates
+
+def _simulated_build(node):
+    # Stand-in for compiling/linking: sleep for a per-component time
+    time.sleep(0.05 if node.endswith('.swift') else 0.1)
+    return f"built {node}"
+
 # Example Usage: Xcode Dependency Graph
 def main():
     # Example graph representing Xcode project dependencies
@@ -97,5 +569,34 @@ def main():
     else:
         print("Cycle detected in dependencies (DFS)")
 
+    # Integer-indexed core: same orders, plus the actual cycle when there is one
+    core = CSRGraph.from_adjacency(xcode_graph)
+    print("CSR Kahn Build Order:", core.topological_sort_kahn())
+    cyclic = dict(xcode_graph, App=['File1.swift'])
+    print("Cycles after adding App -> File1.swift:", CSRGraph.from_adjacency(cyclic).cycles())
+
+    # Run the build itself, independent components in parallel
+    report = parallel_build(xcode_graph, _simulated_build, workers=2)
+    if report:
+        print("Parallel Build Completion Order:", report['order'])
+        for node in report['order']:
+            task_start, task_end = report['timings'][node]
+            print(f"  {node}: {1000 * (task_end - task_start):.0f} ms")
+        print(f"Wall time: {report['wall_time']:.2f}s")
+
+    # Incremental planning: only what an edit actually affects is rebuilt
+    sources = {node: f"contents of {node}" for node in xcode_graph}
+    content = lambda node: hashlib.sha256(sources[node].encode()).hexdigest()
+    cache = BuildCache()
+    order, updates = plan_incremental_build(xcode_graph, xcode_graph, content, cache)
+    cache.update(updates)
+    print("Full Build Plan:", order)
+    print("No-op Build Plan:", plan_incremental_build(xcode_graph, [], content, cache)[0])
+    sources['File1.swift'] = "edited contents"
+    order, updates = plan_incremental_build(xcode_graph, ['File1.swift'], content, cache)
+    cache.update(updates)
+    print("After Editing File1.swift:", order)
+    print("Touch Without Edit:", plan_incremental_build(xcode_graph, ['File2.swift'], content, cache)[0])
+
 if __name__ == "__main__":
     main()
\ No newline at end of file